@@ -1,4 +1,5 @@
 from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.local import LocalProxy
 from flask import (
     Flask,
     render_template,
@@ -10,21 +11,41 @@ from flask import (
     flash,
     render_template_string,
     Response,
+    stream_with_context,
+    g,
+    send_file,
+    abort,
+    has_request_context,
 )
 import os
 import re
 import time
 import uuid
 import secrets
+import base64
+import zlib
+import sqlite3
+import gzip
+import glob
+import hashlib
+import mimetypes
+import threading
 import logging
 import csv
+import json
+import random
+import click
 import requests
-from io import StringIO
+from requests.adapters import HTTPAdapter
+from io import StringIO, BytesIO
 from datetime import timedelta, datetime
 from pathlib import Path
 from urllib.parse import urlparse, urljoin
 from functools import wraps
-from collections import defaultdict, deque
+from types import SimpleNamespace
+from collections import defaultdict, OrderedDict, Counter
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import (
@@ -35,10 +56,18 @@ from flask_login import (
     current_user,
     login_required,
 )
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import generate_password_hash, check_password_hash, safe_join
 from werkzeug.utils import secure_filename
-from sqlalchemy import text, or_
-from PIL import Image
+from sqlalchemy import text, or_, update, insert, select, bindparam, func, tuple_, event, inspect as sa_inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import selectinload
+from sqlalchemy.exc import IntegrityError
+from PIL import Image, ImageOps, ImageFilter, features
+
+try:
+    import brotli  # опционально: pip install brotli
+except ImportError:
+    brotli = None
 
 def admin_required(fn):
     @wraps(fn)
@@ -87,6 +116,10 @@ def norm_text(s: str, max_len: int = 120) -> str:
     return s[:max_len]
 
 
+def phone_digits(s: str) -> str:
+    return re.sub(r"\D", "", s or "")[:40]
+
+
 def norm_contact(s: str, max_len: int = 80) -> str:
     if not s:
         return ""
@@ -175,45 +208,231 @@ def allowed_file(filename: str) -> bool:
 
 
 # ======================
-# #22: Simple rate limit (in-memory)
+# #22 / PERF-12: RATE LIMIT STORE (общий для всех воркеров)
 # ======================
-_rl_hits = defaultdict(lambda: deque())  # key -> timestamps
+# RATELIMIT_STORAGE:
+#   sqlite (по умолчанию) — файл на диске, общий для gunicorn-воркеров одной машины
+#   memory               — только текущий процесс (dev)
+#   redis://...          — несколько машин (пакет redis из requirements.txt)
+#
+# Лимит — fixed window: не больше limit запросов в каждом окне [k*window, (k+1)*window),
+# сумма по всем воркерам. На стыке двух окон подряд может пройти до 2*limit.
+RATELIMIT_STORAGE = os.getenv("RATELIMIT_STORAGE", "sqlite")
+RATELIMIT_SQLITE_PATH = os.getenv("RATELIMIT_SQLITE_PATH", os.path.join("data", "ratelimit.db"))
+RATELIMIT_MAX_KEYS = int(os.getenv("RATELIMIT_MAX_KEYS", "100000"))
+# сколько запрос ждёт занятый файл SQLite, прежде чем сработает RATELIMIT_FAIL_OPEN
+RATELIMIT_SQLITE_TIMEOUT_SEC = float(os.getenv("RATELIMIT_SQLITE_TIMEOUT_SEC", "0.2"))
+# хранилище недоступно: 1 — пропускаем запросы (по умолчанию), 0 — отказываем
+RATELIMIT_FAIL_OPEN = os.getenv("RATELIMIT_FAIL_OPEN", "1") == "1"
+
+
+def _window_take(count, window_id, now, limit, window_sec):
+    """Fixed window. -> (allowed, count, window_id, expires_at) для записи обратно."""
+    current = int(now // window_sec)
+    if window_id != current:
+        count = 0
+    expires_at = (current + 1) * window_sec
+    if count >= limit:
+        return False, count, current, expires_at
+    return True, count + 1, current, expires_at
+
+
+class MemoryRateLimitStore:
+    """Один процесс. LRU + истечение: память ограничена RATELIMIT_MAX_KEYS."""
+
+    def __init__(self, max_keys: int = RATELIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._items = OrderedDict()  # key -> (a, b, expires_at)
+        self._lock = threading.Lock()
+
+    def _get(self, key, now):
+        item = self._items.get(key)
+        if item is None or item[2] <= now:
+            self._items.pop(key, None)
+            return None
+        self._items.move_to_end(key)
+        return item
+
+    def _put(self, key, a, b, expires_at):
+        self._items[key] = (a, b, expires_at)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_keys:
+            self._items.popitem(last=False)
+
+    def take(self, key: str, limit: int, window_sec: int) -> bool:
+        now = time.time()
+        with self._lock:
+            item = self._get(key, now)
+            allowed, count, window_id, expires_at = _window_take(
+                item[0] if item else 0, item[1] if item else None, now, limit, window_sec
+            )
+            self._put(key, count, window_id, expires_at)
+            return allowed
 
+    def get(self, key: str):
+        with self._lock:
+            item = self._get(key, time.time())
+            return item[0] if item else None
 
-def _rl_key(scope: str) -> str:
-    xff = request.headers.get("X-Forwarded-For", "")
-    ip = xff.split(",")[0].strip() if xff else (request.remote_addr or "unknown")
-    return f"{scope}:{ip}"
+    def set(self, key: str, value: float, ttl_sec: int):
+        now = time.time()
+        with self._lock:
+            self._put(key, value, now, now + ttl_sec)
 
+    def delete(self, key: str):
+        with self._lock:
+            self._items.pop(key, None)
 
-def _rl_allow(scope: str, limit: int, window_sec: int) -> bool:
+    def add(self, key: str, ttl_sec: float) -> bool:
+        now = time.time()
+        with self._lock:
+            if self._get(key, now) is not None:
+                return False
+            self._put(key, 1, now, now + ttl_sec)
+            return True
+
+
+class SQLiteRateLimitStore:
     """
-    True  -> разрешаем
-    False -> превышен лимит
+    Общий файл SQLite (WAL): все воркеры видят одни и те же счётчики.
+    Каждая операция — BEGIN IMMEDIATE, поэтому take() атомарен между процессами.
+    Занятый файл ждём не дольше RATELIMIT_SQLITE_TIMEOUT_SEC, дальше — sqlite3.OperationalError.
+    """
+
+    CLEANUP_EVERY = 1000
+
+    def __init__(self, path: str, max_keys: int = RATELIMIT_MAX_KEYS, timeout: float = RATELIMIT_SQLITE_TIMEOUT_SEC):
+        self.path = path
+        self.max_keys = max_keys
+        self.timeout = timeout
+        self._local = threading.local()
+        self._ops = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rl (k TEXT PRIMARY KEY, a REAL, b REAL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS rl_expires ON rl (expires_at)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _maybe_cleanup(self, conn, now):
+        self._ops += 1
+        if self._ops % self.CLEANUP_EVERY:
+            return
+        conn.execute("DELETE FROM rl WHERE expires_at <= ?", (now,))
+        # переполнение (флуд подменёнными IP) — выкидываем ключи, которые истекают раньше всех
+        extra = conn.execute("SELECT COUNT(*) FROM rl").fetchone()[0] - self.max_keys
+        if extra > 0:
+            conn.execute("DELETE FROM rl WHERE k IN (SELECT k FROM rl ORDER BY expires_at LIMIT ?)", (extra,))
+
+    def take(self, key: str, limit: int, window_sec: int) -> bool:
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT a, b FROM rl WHERE k = ? AND expires_at > ?", (key, now)).fetchone()
+            allowed, count, window_id, expires_at = _window_take(
+                row[0] if row else 0, row[1] if row else None, now, limit, window_sec
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO rl (k, a, b, expires_at) VALUES (?, ?, ?, ?)",
+                (key, count, window_id, expires_at),
+            )
+            self._maybe_cleanup(conn, now)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed
+
+    def get(self, key: str):
+        row = self._conn().execute("SELECT a FROM rl WHERE k = ? AND expires_at > ?", (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: float, ttl_sec: int):
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO rl (k, a, b, expires_at) VALUES (?, ?, ?, ?)", (key, value, now, now + ttl_sec)
+        )
+
+    def delete(self, key: str):
+        self._conn().execute("DELETE FROM rl WHERE k = ?", (key,))
+
+    def add(self, key: str, ttl_sec: float) -> bool:
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM rl WHERE k = ? AND expires_at <= ?", (key, now))
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO rl (k, a, b, expires_at) VALUES (?, 1, ?, ?)", (key, now, now + ttl_sec)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cur.rowcount == 1
+
+
+class RedisRateLimitStore:
+    """Redis: fixed window в Lua-скрипте (как _window_take), память ограничена TTL ключей."""
+
+    TAKE_LUA = """
+    local now, limit, window = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local current = math.floor(now / window)
+    local s = redis.call('HMGET', KEYS[1], 'a', 'b')
+    local count = 0
+    if s[1] and tonumber(s[2]) == current then
+        count = tonumber(s[1])
+    end
+    if count >= limit then
+        return 0
+    end
+    redis.call('HSET', KEYS[1], 'a', count + 1, 'b', current)
+    redis.call('PEXPIREAT', KEYS[1], math.ceil((current + 1) * window * 1000))
+    return 1
     """
-    now = time.time()
-    key = _rl_key(scope)
-    q = _rl_hits[key]
 
-    while q and (now - q[0]) > window_sec:
-        q.popleft()
+    def __init__(self, url: str):
+        import redis  # опциональная зависимость
 
-    if len(q) >= limit:
-        return False
+        self.r = redis.Redis.from_url(url)
+        self._take = self.r.register_script(self.TAKE_LUA)
 
-    q.append(now)
-    return True
+    def take(self, key: str, limit: int, window_sec: int) -> bool:
+        return bool(self._take(keys=[f"rl:{key}"], args=[time.time(), limit, window_sec]))
 
+    def get(self, key: str):
+        value = self.r.get(f"rlv:{key}")
+        return float(value) if value is not None else None
 
-# =========================
-# #26B: Anti brute-force by IP (login)
-# =========================
-MAX_FAILS = 8
-WINDOW_SEC = 10 * 60
-BAN_SEC = 30 * 60
+    def set(self, key: str, value: float, ttl_sec: int):
+        self.r.set(f"rlv:{key}", value, ex=int(ttl_sec))
 
-_failed_logins = defaultdict(lambda: deque())  # ip -> timestamps
-_banned_until = {}  # ip -> unix time
+    def delete(self, key: str):
+        self.r.delete(f"rl:{key}", f"rlv:{key}")
+
+    def add(self, key: str, ttl_sec: float) -> bool:
+        return bool(self.r.set(f"rlv:{key}", 1, px=max(1, int(ttl_sec * 1000)), nx=True))
+
+
+def make_rate_limit_store(storage: str = RATELIMIT_STORAGE):
+    if storage.startswith(("redis://", "rediss://")):
+        return RedisRateLimitStore(storage)
+    if storage == "memory":
+        return MemoryRateLimitStore()
+    return SQLiteRateLimitStore(RATELIMIT_SQLITE_PATH)
+
+
+rl_store = make_rate_limit_store()
 
 
 def _client_ip():
@@ -223,34 +442,54 @@ def _client_ip():
     return request.remote_addr or "unknown"
 
 
-def _cleanup_old(ip: str, now: float):
-    q = _failed_logins[ip]
-    while q and (now - q[0]) > WINDOW_SEC:
-        q.popleft()
+def _rl_key(scope: str) -> str:
+    return f"{scope}:{_client_ip()}"
+
+
+def _rl_allow(scope: str, limit: int, window_sec: int) -> bool:
+    """
+    True  -> разрешаем
+    False -> превышен лимит
+    """
+    try:
+        return rl_store.take(_rl_key(scope), limit, window_sec)
+    except Exception as e:
+        logger.warning("rate limit store unavailable (%r), fail %s", e, "open" if RATELIMIT_FAIL_OPEN else "closed")
+        return RATELIMIT_FAIL_OPEN
+
+
+# =========================
+# #26B: Anti brute-force by IP (login)
+# =========================
+MAX_FAILS = 8
+WINDOW_SEC = 10 * 60
+BAN_SEC = 30 * 60
 
 
 def is_ip_banned(ip: str) -> bool:
-    now = time.time()
-    until = _banned_until.get(ip)
-    if not until:
-        return False
-    if now >= until:
-        _banned_until.pop(ip, None)
-        return False
-    return True
+    try:
+        until = rl_store.get(f"ban:{ip}")
+    except Exception as e:
+        logger.warning("rate limit store unavailable (%r), fail %s", e, "open" if RATELIMIT_FAIL_OPEN else "closed")
+        return not RATELIMIT_FAIL_OPEN
+    return bool(until) and time.time() < until
 
 
 def register_failed_attempt(ip: str):
-    now = time.time()
-    _cleanup_old(ip, now)
-    _failed_logins[ip].append(now)
-    if len(_failed_logins[ip]) >= MAX_FAILS:
-        _banned_until[ip] = now + BAN_SEC
+    # MAX_FAILS неудачных попыток за WINDOW_SEC -> бан на BAN_SEC
+    try:
+        if not rl_store.take(f"fail:{ip}", MAX_FAILS - 1, WINDOW_SEC):
+            rl_store.set(f"ban:{ip}", time.time() + BAN_SEC, BAN_SEC)
+    except Exception:
+        logger.exception("rate limit store error")
 
 
 def reset_attempts(ip: str):
-    _failed_logins.pop(ip, None)
-    _banned_until.pop(ip, None)
+    try:
+        rl_store.delete(f"fail:{ip}")
+        rl_store.delete(f"ban:{ip}")
+    except Exception:
+        logger.exception("rate limit store error")
 
 
 # ======================
@@ -268,6 +507,110 @@ def unauthorized():
     return redirect(url_for("login", lang=session.get("lang", "ru")))
 
 
+# ======================
+# PERF-25: QUERY STATS PER REQUEST (Server-Timing, бюджет, N+1)
+# ======================
+DB_QUERY_BUDGET = int(os.getenv("DB_QUERY_BUDGET", "20"))
+DB_TIME_BUDGET_MS = float(os.getenv("DB_TIME_BUDGET_MS", "200"))
+DB_N1_THRESHOLD = int(os.getenv("DB_N1_THRESHOLD", "5"))  # одинаковый SQL N раз за запрос
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1" if APP_ENV == "dev" else "0") == "1"
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.time_ms = 0.0
+        self.statements = Counter()
+
+    def add(self, statement: str, elapsed_ms: float):
+        self.count += 1
+        self.time_ms += elapsed_ms
+        self.statements[statement] += 1
+
+    def repeated(self, threshold: int = DB_N1_THRESHOLD) -> list:
+        return [(sql, n) for sql, n in self.statements.most_common() if n >= threshold]
+
+
+_query_recorders = threading.local()
+_route_query_stats = defaultdict(lambda: {"requests": 0, "queries": 0, "db_ms": 0.0, "max_queries": 0})
+_route_query_stats_lock = threading.Lock()
+
+
+@contextmanager
+def count_queries():
+    """
+    Для тестов / отладки: запросы текущего потока внутри блока.
+
+        with count_queries() as q:
+            client.get("/catalog")
+        assert q.count <= 3, q.statements
+    """
+    stats = QueryStats()
+    stack = getattr(_query_recorders, "stack", None)
+    if stack is None:
+        stack = _query_recorders.stack = []
+    stack.append(stats)
+    try:
+        yield stats
+    finally:
+        stack.remove(stats)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    # время старта — на контексте выполнения, а не в conn.info: если драйвер упал,
+    # after_cursor_execute не придёт, и контекст просто выбрасывается вместе с отметкой
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_started", None)
+    elapsed_ms = (time.perf_counter() - started) * 1000 if started is not None else 0.0
+
+    for stats in getattr(_query_recorders, "stack", ()):
+        stats.add(statement, elapsed_ms)
+
+    if has_request_context():
+        stats = g.get("query_stats")
+        if stats is None:
+            stats = g.query_stats = QueryStats()
+        stats.add(statement, elapsed_ms)
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def report_query_stats(resp):
+    stats = g.get("query_stats") or QueryStats()
+    total_ms = (time.perf_counter() - g.get("request_started", time.perf_counter())) * 1000
+
+    if SERVER_TIMING:
+        resp.headers["Server-Timing"] = (
+            f'db;dur={stats.time_ms:.1f};desc="{stats.count} queries", app;dur={total_ms:.1f}'
+        )
+
+    with _route_query_stats_lock:
+        route = _route_query_stats[request.endpoint or "-"]
+        route["requests"] += 1
+        route["queries"] += stats.count
+        route["db_ms"] += stats.time_ms
+        route["max_queries"] = max(route["max_queries"], stats.count)
+
+    if stats.count > DB_QUERY_BUDGET or stats.time_ms > DB_TIME_BUDGET_MS:
+        logger.warning(
+            "query budget %s %s: %s queries, %.1f ms db, %.1f ms total",
+            request.method, request.path, stats.count, stats.time_ms, total_ms,
+        )
+    for sql, n in stats.repeated():
+        logger.warning("possible N+1 on %s %s: %sx %s", request.method, request.path, n, " ".join(sql.split())[:200])
+    return resp
+
+
 # ======================
 # MODELS
 # ======================
@@ -281,7 +624,7 @@ class User(UserMixin, db.Model):
 class OrderStatusHistory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
 
-    order_id = db.Column(db.Integer, db.ForeignKey("order.id"), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey("order.id"), nullable=False, index=True)
     order = db.relationship("Order", backref="status_history")
 
     old_status = db.Column(db.String(30))
@@ -346,8 +689,33 @@ class Product(db.Model):
     # (опционально) оставь старое поле, чтобы ничего не ломать при миграции
     legacy_category = db.Column(db.String(50), nullable=True)
 
+    # PERF-19: JSON {"webp": [[320, "uploads/x.w320.webp"], ...], "avif": [...]}
+    image_variants = db.Column(db.Text, nullable=True)
+    # PERF-24: размытая заглушка (data: URI, < 1 КБ) и размеры оригинала
+    image_lqip = db.Column(db.Text, nullable=True)
+    image_width = db.Column(db.Integer, nullable=True)
+    image_height = db.Column(db.Integer, nullable=True)
+
+    def variants(self) -> dict:
+        try:
+            return json.loads(self.image_variants) if self.image_variants else {}
+        except ValueError:
+            return {}
+
+    def srcset(self, fmt: str) -> str:
+        return ", ".join(
+            f"{url_for('static', filename=path)} {width}w" for width, path in self.variants().get(fmt, [])
+        )
+
 class Order(db.Model):
     __tablename__ = "order"
+    __table_args__ = (
+        # активные: is_deleted = false AND status NOT IN (...) ORDER BY created_at DESC
+        db.Index("ix_order_deleted_status_created", "is_deleted", "status", "created_at", "id"),
+        # архив (is_deleted OR status IN ...) + сортировка по дате
+        db.Index("ix_order_status_created", "status", "created_at"),
+        db.Index("ix_order_created_id", "created_at", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
@@ -356,6 +724,7 @@ class Order(db.Model):
 
     name = db.Column(db.String(100), nullable=False)
     contact = db.Column(db.String(100), nullable=False)
+    phone_digits = db.Column(db.String(40), nullable=True)  # только цифры контакта — для поиска
 
     # ✅ НОВОЕ
     address = db.Column(db.String(200), default="")
@@ -368,10 +737,64 @@ class Order(db.Model):
     status = db.Column(db.String(30), default="new")
     is_deleted = db.Column(db.Boolean, default=False)
 
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # ключ keyset-пагинации (created_at, id): NULL в нём выпадал бы из страниц (миграция 011)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
     delivery_provider = db.Column(db.String(30), default="manual")  # manual / bolt / wolt
     tracking_code = db.Column(db.String(80), default="")            # номер/код доставки
+
+
+class OrderItem(db.Model):
+    """Строка заказа. name/unit_price — снимок на момент оформления."""
+    __tablename__ = "order_item"
+    __table_args__ = (db.Index("ix_order_item_product_order", "product_id", "order_id"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    order_id = db.Column(db.Integer, db.ForeignKey("order.id"), nullable=False, index=True)
+    order = db.relationship("Order", backref="order_items")
+
+    # без FK: товар можно удалить навсегда, а история продаж должна остаться
+    product_id = db.Column(db.Integer, nullable=True)
+    name = db.Column(db.String(200), nullable=False)
+    unit_price = db.Column(db.Float, nullable=True)
+    qty = db.Column(db.Integer, nullable=False)
+
+
+class TelegramOutbox(db.Model):
+    """
+    Исходящие сообщения в Telegram. Пишутся в той же транзакции, что и заказ,
+    отправляет их TelegramOutboxDispatcher в фоне.
+    """
+    __tablename__ = "telegram_outbox"
+    __table_args__ = (db.Index("ix_telegram_outbox_due", "status", "next_attempt_at"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    method = db.Column(db.String(60), nullable=False, default="sendMessage")
+    payload = db.Column(db.Text, nullable=False)  # JSON без токена бота
+
+    status = db.Column(db.String(20), nullable=False, default="pending")  # pending / sent / failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.String(500), nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+
+class UploadBlob(db.Model):
+    """
+    Загруженный файл, адресуемый содержимым: uploads/<sha256>.<ext>.
+    refcount — сколько товаров на него ссылается; при 0 файл удаляет фоновая чистка.
+    """
+    __tablename__ = "upload_blob"
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    path = db.Column(db.String(200), nullable=False, unique=True)  # относительно static/
+    size = db.Column(db.Integer, nullable=False, default=0)
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    orphaned_at = db.Column(db.DateTime, nullable=True, index=True)  # когда refcount стал 0
 # ======================
 # USER LOADER
 # ======================
@@ -381,85 +804,228 @@ def load_user(user_id):
 
 
 # ======================
-# INIT DB (SAFE) — ONE BLOCK
+# PERF-11: SCHEMA MIGRATIONS (версия схемы + явная команда)
 # ======================
-with app.app_context():
+# Миграции идемпотентны: проверяют состояние схемы, а не полагаются на IF NOT EXISTS
+# (SQLite не умеет ADD COLUMN IF NOT EXISTS). Применяются командой:
+#     flask --app app db-upgrade
+# На старте воркера — только одна проверка версии (AUTO_MIGRATE=1 — применить сразу).
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "1" if APP_ENV == "dev" else "0") == "1"
+
+
+class SchemaVersion(db.Model):
+    __tablename__ = "schema_version"
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+def _table_columns(table: str) -> set:
+    # через соединение сессии — видим изменения текущей (ещё не закоммиченной) миграции
+    return {c["name"] for c in sa_inspect(db.session.connection()).get_columns(table)}
+
+
+def _add_column(table: str, column: str, ddl: str):
+    if column not in _table_columns(table):
+        db.session.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl}'))
+
+
+def _m001_create_tables():
     db.create_all()
 
-    # order.is_deleted
-    try:
-        db.session.execute(text('ALTER TABLE "order" ADD COLUMN IF NOT EXISTS is_deleted BOOLEAN DEFAULT FALSE'))
-        db.session.commit()
-    except Exception:
-        db.session.rollback()
 
-    # product.is_active
-    try:
-        db.session.execute(text("ALTER TABLE product ADD COLUMN IF NOT EXISTS is_active BOOLEAN DEFAULT TRUE"))
-        db.session.commit()
-    except Exception:
-        db.session.rollback()
+def _m002_order_columns():
+    _add_column("order", "is_deleted", "BOOLEAN DEFAULT FALSE")
+    _add_column("order", "address", "VARCHAR(200) DEFAULT ''")
+    _add_column("order", "delivery_time", "VARCHAR(60) DEFAULT ''")
+    _add_column("order", "courier", "VARCHAR(80) DEFAULT ''")
+    _add_column("order", "delivery_provider", "VARCHAR(30) DEFAULT 'manual'")
+    _add_column("order", "tracking_code", "VARCHAR(80) DEFAULT ''")
+
+
+def _m003_product_columns():
+    _add_column("product", "is_active", "BOOLEAN DEFAULT TRUE")
 
     # если раньше было product.category — переименуем в legacy_category
-    try:
+    cols = _table_columns("product")
+    if "category" in cols and "legacy_category" not in cols:
         db.session.execute(text("ALTER TABLE product RENAME COLUMN category TO legacy_category"))
-        db.session.commit()
-    except Exception:
-        db.session.rollback()
-
-    # на всякий случай: legacy_category может отсутствовать
-    try:
-        db.session.execute(text("ALTER TABLE product ADD COLUMN IF NOT EXISTS legacy_category VARCHAR(50)"))
-        db.session.commit()
-    except Exception:
-        db.session.rollback()
 
-    # product.category_id
-    try:
-        db.session.execute(text("ALTER TABLE product ADD COLUMN IF NOT EXISTS category_id INTEGER"))
-        db.session.commit()
-    except Exception:
-        db.session.rollback()
+    _add_column("product", "legacy_category", "VARCHAR(50)")
+    _add_column("product", "category_id", "INTEGER")
 
-    # дефолтные категории
-    def ensure_category(slug, ru, lv, en, sort):
-        if not Category.query.filter_by(slug=slug).first():
-            db.session.add(Category(slug=slug, title_ru=ru, title_lv=lv, title_en=en, sort=sort, is_active=True))
 
-    ensure_category("wallpaper", "Обои", "Tapetes", "Wallpaper", 1)
-    ensure_category("doors", "Двери", "Durvis", "Doors", 2)
-    ensure_category("windows", "Окна", "Logi", "Windows", 3)
-    db.session.commit()
+# Миграции с данными не грузят ORM-объекты целиком: модель уже описывает схему HEAD,
+# а колонки из более поздних миграций в БД ещё нет. Только явные колонки / core update().
+def _m004_default_categories():
+    existing = {slug for (slug,) in db.session.query(Category.slug)}
+    for slug, ru, lv, en, sort in (
+        ("wallpaper", "Обои", "Tapetes", "Wallpaper", 1),
+        ("doors", "Двери", "Durvis", "Doors", 2),
+        ("windows", "Окна", "Logi", "Windows", 3),
+    ):
+        if slug not in existing:
+            db.session.execute(insert(Category).values(
+                slug=slug, title_ru=ru, title_lv=lv, title_en=en, sort=sort, is_active=True
+            ))
 
     # привязка старых товаров к новым категориям
-    try:
-        mapping = {c.slug: c.id for c in Category.query.all()}
-        default_id = mapping.get("doors")
+    mapping = dict(db.session.query(Category.slug, Category.id))
+    default_id = mapping.get("doors")
+    rows = db.session.query(Product.id, Product.legacy_category).filter(Product.category_id.is_(None)).all()
+    for product_id, legacy in rows:
+        slug = (legacy or "").strip() or "doors"
+        db.session.execute(
+            update(Product).where(Product.id == product_id).values(category_id=mapping.get(slug, default_id))
+        )
 
-        products = Product.query.filter(Product.category_id.is_(None)).all()
-        for p in products:
-            slug = (p.legacy_category or "").strip() or "doors"
-            p.category_id = mapping.get(slug, default_id)
 
-        db.session.commit()
-    except Exception:
-        db.session.rollback()
+def _m005_order_list_indexes():
+    for idx in list(Order.__table__.indexes) + list(OrderStatusHistory.__table__.indexes):
+        idx.create(db.session.connection(), checkfirst=True)
 
-       # ✅ order.address / order.delivery_time / order.courier
-    try:
-        db.session.execute(text('ALTER TABLE "order" ADD COLUMN IF NOT EXISTS address VARCHAR(200) DEFAULT \'\''))
-        db.session.execute(text('ALTER TABLE "order" ADD COLUMN IF NOT EXISTS delivery_time VARCHAR(60) DEFAULT \'\''))
-        db.session.execute(text('ALTER TABLE "order" ADD COLUMN IF NOT EXISTS courier VARCHAR(80) DEFAULT \'\''))
-        db.session.commit()
-    except Exception:
-        db.session.rollback()
 
+def _m006_order_phone_digits():
+    _add_column("order", "phone_digits", "VARCHAR(40)")
+    while True:
+        rows = db.session.query(Order.id, Order.contact).filter(Order.phone_digits.is_(None)).limit(1000).all()
+        if not rows:
+            break
+        for order_id, contact in rows:
+            db.session.execute(
+                update(Order).where(Order.id == order_id).values(phone_digits=phone_digits(contact))
+            )
+
+
+def _m007_order_search_trgm():
+    # Postgres: триграммные индексы для поиска ILIKE '%q%'
+    if db.engine.dialect.name != "postgresql":
+        return
+    db.session.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    for col in ("name", "contact", "phone_digits"):
+        db.session.execute(text(
+            f'CREATE INDEX IF NOT EXISTS ix_order_{col}_trgm ON "order" USING gin ({col} gin_trgm_ops)'
+        ))
+
+
+def _m008_product_image_variants():
+    _add_column("product", "image_variants", "TEXT")
+
+
+def _m009_upload_blobs():
+    UploadBlob.__table__.create(db.session.connection(), checkfirst=True)
+
+    # существующие загрузки (uuid-имена) -> blob'ы; одинаковые файлы сводим к одному пути
+    blobs = {}  # sha256 -> [path, size, refcount]
+    rows = db.session.query(Product.id, Product.image).filter(Product.image.like("uploads/%")).all()
+    for product_id, image in rows:
+        abs_path = os.path.join(app.static_folder, image)
+        if not os.path.isfile(abs_path):
+            continue
+        digest = _file_sha256(abs_path)
+        blob = blobs.setdefault(digest, [image, os.path.getsize(abs_path), 0])
+        blob[2] += 1
+        if image != blob[0]:
+            db.session.execute(
+                update(Product).where(Product.id == product_id).values(image=blob[0], image_variants=None)
+            )
+
+    existing = {sha for (sha,) in db.session.query(UploadBlob.sha256).filter(UploadBlob.sha256.in_(list(blobs)))}
+    for digest, (path, size, refcount) in blobs.items():
+        if digest in existing:
+            db.session.execute(
+                update(UploadBlob).where(UploadBlob.sha256 == digest).values(refcount=UploadBlob.refcount + refcount)
+            )
+        else:
+            db.session.execute(insert(UploadBlob).values(sha256=digest, path=path, size=size, refcount=refcount))
+
+
+def _m010_product_image_lqip():
+    _add_column("product", "image_lqip", "TEXT")
+    _add_column("product", "image_width", "INTEGER")
+    _add_column("product", "image_height", "INTEGER")
+
+
+def _m011_order_created_at_not_null():
+    # старые заказы без даты: время первой смены статуса, иначе 1970-01-01 (в конец списка)
+    first_status = (
+        select(func.min(OrderStatusHistory.created_at))
+        .where(OrderStatusHistory.order_id == Order.id)
+        .scalar_subquery()
+    )
+    db.session.execute(
+        update(Order)
+        .where(Order.created_at.is_(None))
+        .values(created_at=func.coalesce(first_status, datetime(1970, 1, 1)))
+    )
+    # SQLite не умеет ALTER COLUMN: там NOT NULL есть только у новых БД (create_all), данные уже заполнены
+    if db.engine.dialect.name == "postgresql":
+        db.session.execute(text('ALTER TABLE "order" ALTER COLUMN created_at SET NOT NULL'))
+
+
+MIGRATIONS = [
+    (1, "create tables", _m001_create_tables),
+    (2, "order: archive/delivery columns", _m002_order_columns),
+    (3, "product: is_active/legacy_category/category_id", _m003_product_columns),
+    (4, "default categories + legacy category backfill", _m004_default_categories),
+    (5, "order list indexes", _m005_order_list_indexes),
+    (6, "order.phone_digits", _m006_order_phone_digits),
+    (7, "pg_trgm search indexes", _m007_order_search_trgm),
+    (8, "product.image_variants", _m008_product_image_variants),
+    (9, "upload_blob + backfill", _m009_upload_blobs),
+    (10, "product.image_lqip/width/height", _m010_product_image_lqip),
+    (11, "order.created_at backfill + NOT NULL", _m011_order_created_at_not_null),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def current_schema_version() -> int:
     try:
-        db.session.execute(text('ALTER TABLE "order" ADD COLUMN IF NOT EXISTS delivery_provider VARCHAR(30) DEFAULT \'manual\''))
-        db.session.execute(text('ALTER TABLE "order" ADD COLUMN IF NOT EXISTS tracking_code VARCHAR(80) DEFAULT \'\''))
-        db.session.commit()
+        return db.session.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
     except Exception:
         db.session.rollback()
+        return 0
+
+
+def migrate_schema() -> int:
+    """Применяет недостающие миграции, каждую в своей транзакции. Возвращает итоговую версию."""
+    SchemaVersion.__table__.create(db.engine, checkfirst=True)
+
+    with db.engine.connect() as lock_conn:
+        is_pg = db.engine.dialect.name == "postgresql"
+        if is_pg:
+            # параллельный деплой: миграции выполняет только один процесс
+            lock_conn.execute(text("SELECT pg_advisory_lock(70617701)"))
+
+        try:
+            version = current_schema_version()
+            for num, title, fn in MIGRATIONS:
+                if num <= version:
+                    continue
+                started = time.perf_counter()
+                fn()
+                db.session.add(SchemaVersion(version=num))
+                db.session.commit()
+                version = num
+                logger.info("migration %03d %s: %.0f ms", num, title, (time.perf_counter() - started) * 1000)
+                # миграции могли поменять данные — сбрасываем кэши во всех воркерах
+                categories_changed()
+                catalog_changed()
+            return version
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            if is_pg:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(70617701)"))
+
+
+@app.cli.command("db-upgrade")
+def db_upgrade_command():
+    with app.app_context():
+        print(f"schema version: {migrate_schema()}")
+
 
 # ======================
 # ADMIN ACCESS CONTROL
@@ -479,10 +1045,85 @@ def admin_required(f):
 # ======================
 # TELEGRAM
 # ======================
+TG_API_BASE = os.getenv("TG_API_BASE", "https://api.telegram.org").rstrip("/")
+
+
+# ======================
+# PERF-4: TELEGRAM HTTP CLIENT (keep-alive pool)
+# ======================
+class TelegramClient:
+    """
+    Один requests.Session на процесс: TCP+TLS до api.telegram.org
+    переиспользуется между вызовами. Таймаут задаётся на каждый вызов.
+    """
+
+    def __init__(self, api_base: str = None, timeout=(3.05, 10), pool_size: int = 10):
+        self.api_base = (api_base or TG_API_BASE).rstrip("/")
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def _get_session(self) -> requests.Session:
+        # после fork (gunicorn) сокеты родителя не используем
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    sess = requests.Session()
+                    adapter = HTTPAdapter(
+                        pool_connections=1, pool_maxsize=self.pool_size, max_retries=0
+                    )
+                    sess.mount("https://", adapter)
+                    sess.mount("http://", adapter)
+                    self._session = sess
+                    self._pid = os.getpid()
+        return self._session
+
+    def call(self, method: str, payload: dict, timeout=None) -> requests.Response:
+        """POST /bot<token>/<method>. Сетевые ошибки пробрасываются наружу."""
+        token = os.getenv("TG_BOT_TOKEN")
+        if not token:
+            raise RuntimeError("TG_BOT_TOKEN not set")
+
+        started = time.perf_counter()
+        ok = False
+        try:
+            r = self._get_session().post(
+                f"{self.api_base}/bot{token}/{method}",
+                json=payload,
+                timeout=timeout or self.timeout,
+            )
+            ok = r.ok
+            return r
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self.calls += 1
+                self.errors += 0 if ok else 1
+                self.total_ms += ms
+                self.max_ms = max(self.max_ms, ms)
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_ms": round(self.total_ms / self.calls, 1) if self.calls else 0.0,
+            "max_ms": round(self.max_ms, 1),
+        }
+
+
+tg_client = TelegramClient()
+
+
 def send_telegram(message: str, reply_markup: dict | None = None):
-    token = os.getenv("TG_BOT_TOKEN")
     chat_id = os.getenv("TG_CHAT_ID")
-    if not token or not chat_id:
+    if not os.getenv("TG_BOT_TOKEN") or not chat_id:
         logger.warning("Telegram ENV vars not set")
         return False
 
@@ -491,11 +1132,7 @@ def send_telegram(message: str, reply_markup: dict | None = None):
         payload["reply_markup"] = reply_markup
 
     try:
-        r = requests.post(
-            f"https://api.telegram.org/bot{token}/sendMessage",
-            json=payload,
-            timeout=10,
-        )
+        r = tg_client.call("sendMessage", payload)
         logger.info("TG response: %s %s", r.status_code, r.text)
         return r.ok
     except Exception as e:
@@ -504,40 +1141,245 @@ def send_telegram(message: str, reply_markup: dict | None = None):
 
 
 # ======================
-# CONSTANTS (ORDERS)
+# PERF-3: TELEGRAM OUTBOX + DISPATCHER
 # ======================
+TG_OUTBOX_WORKER = os.getenv("TG_OUTBOX_WORKER", "thread").lower()  # thread / off
+TG_OUTBOX_POLL_SEC = float(os.getenv("TG_OUTBOX_POLL_SEC", "5"))
+# общий для всех воркеров (слот в rl_store), а не на процесс: группа — ~20 сообщений/мин
+TG_OUTBOX_RATE_PER_SEC = float(os.getenv("TG_OUTBOX_RATE_PER_SEC", "1"))
+TG_OUTBOX_MAX_ATTEMPTS = int(os.getenv("TG_OUTBOX_MAX_ATTEMPTS", "10"))
+TG_OUTBOX_LEASE_SEC = 60
+TG_OUTBOX_MAX_BACKOFF_SEC = 15 * 60
 
-# Заголовки таблицы заказов
-ORDER_TABLE_LABELS = {
-    "order":   {"ru": "Заказ",   "lv": "Pasūtījums", "en": "Order"},
-    "address": {"ru": "Адрес",   "lv": "Adrese",     "en": "Address"},
-    "time":    {"ru": "Время",   "lv": "Laiks",      "en": "Time"},
-    "courier": {"ru": "Курьер",  "lv": "Kurjers",    "en": "Courier"},
-    "status":  {"ru": "Статус",  "lv": "Statuss",    "en": "Status"},
-}
 
-# Каноничные статусы (ТОЛЬКО ОНИ)
-ORDER_STATUSES = {
-    "new": {"ru": "Новый", "lv": "Jauns", "en": "New"},
-    "confirmed": {"ru": "Подтверждён", "lv": "Apstiprināts", "en": "Confirmed"},
+def enqueue_telegram(message: str, reply_markup: dict | None = None) -> bool:
+    """
+    Кладёт сообщение в outbox текущей сессии БД (без commit).
+    Коммитит вызывающий код — вместе со своими данными.
+    """
+    chat_id = os.getenv("TG_CHAT_ID")
+    if not os.getenv("TG_BOT_TOKEN") or not chat_id:
+        logger.warning("Telegram ENV vars not set")
+        return False
 
-    "courier_picked": {"ru": "Курьер забрал", "lv": "Kurjers paņēma", "en": "Courier picked up"},
-    "courier_on_way": {"ru": "Курьер в пути", "lv": "Kurjers ceļā", "en": "Courier on the way"},
-    "courier_arrived": {"ru": "Курьер на месте", "lv": "Kurjers ieradies", "en": "Courier arrived"},
+    payload = {"chat_id": chat_id, "text": message}
+    if reply_markup:
+        payload["reply_markup"] = reply_markup
 
-    "completed": {"ru": "Завершён", "lv": "Pabeigts", "en": "Completed"},
-    "canceled": {"ru": "Отменён", "lv": "Atcelts", "en": "Canceled"},
-}
+    db.session.add(TelegramOutbox(method="sendMessage", payload=json.dumps(payload, ensure_ascii=False)))
+    return True
 
-ALLOWED_STATUS_TRANSITIONS = {
-    "new": ["confirmed", "canceled"],
-    "confirmed": ["courier_picked", "canceled"],
-    "courier_picked": ["courier_on_way", "canceled"],
-    "courier_on_way": ["courier_arrived", "canceled"],
-    "courier_arrived": ["completed", "canceled"],
-    "completed": [],
-    "canceled": [],
-}
+
+class TelegramOutboxDispatcher:
+    """
+    Разбирает telegram_outbox: ретраи с экспоненциальной задержкой,
+    ограничение частоты отправки, учёт retry_after от Telegram.
+
+    Строку "захватывает" атомарный UPDATE (status=pending AND next_attempt_at <= now),
+    поэтому несколько воркеров не отправят одно сообщение дважды.
+    Если процесс упал посреди отправки — строка снова станет доступна через TG_OUTBOX_LEASE_SEC.
+    Каждый захват увеличивает attempts, так что и такая строка упрётся в TG_OUTBOX_MAX_ATTEMPTS.
+
+    Диспетчер работает в каждом воркере, поэтому частоту держит общий слот в rl_store:
+    add() с TTL = 1 / rate проходит только у одного процесса.
+    """
+
+    SEND_SLOT_KEY = "tg:outbox:send"
+
+    def __init__(
+        self, flask_app, client: TelegramClient = None, rate_per_sec: float = None, batch_size: int = 20,
+        store=None,
+    ):
+        self.app = flask_app
+        self.client = client or tg_client
+        self.min_interval = 1.0 / (rate_per_sec or TG_OUTBOX_RATE_PER_SEC)
+        self.batch_size = batch_size
+        self.store = store or rl_store
+        self._last_send = 0.0
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    # ---------- отправка ----------
+    def _post(self, method: str, payload: dict):
+        try:
+            r = self.client.call(method, payload)
+        except Exception as e:
+            return False, None, repr(e)
+
+        if r.ok:
+            return True, None, None
+
+        retry_after = None
+        try:
+            retry_after = (r.json().get("parameters") or {}).get("retry_after")
+        except Exception:
+            pass
+
+        # 4xx (кроме 429) — ошибка в самом сообщении, повтор не поможет
+        if 400 <= r.status_code < 500 and r.status_code != 429:
+            return False, -1, f"{r.status_code} {r.text[:300]}"
+        return False, retry_after, f"{r.status_code} {r.text[:300]}"
+
+    def _throttle(self):
+        while True:
+            try:
+                if self.store.add(self.SEND_SLOT_KEY, self.min_interval):
+                    break
+            except Exception:
+                # общее хранилище недоступно — держим хотя бы частоту этого процесса
+                logger.exception("rate limit store error")
+                break
+            time.sleep(self.min_interval / 4)
+
+        wait = self._last_send + self.min_interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self._last_send = time.monotonic()
+
+    def _claim(self, row_id: int, now: datetime) -> bool:
+        res = db.session.execute(
+            update(TelegramOutbox)
+            .where(
+                TelegramOutbox.id == row_id,
+                TelegramOutbox.status == "pending",
+                TelegramOutbox.next_attempt_at <= now,
+            )
+            .values(
+                attempts=TelegramOutbox.attempts + 1,
+                next_attempt_at=now + timedelta(seconds=TG_OUTBOX_LEASE_SEC),
+            )
+        )
+        db.session.commit()
+        return res.rowcount == 1
+
+    def run_once(self) -> int:
+        """Один проход по готовым к отправке сообщениям. Возвращает число отправленных."""
+        sent = 0
+        with self.app.app_context():
+            now = datetime.utcnow()
+            due_ids = [
+                row_id for (row_id,) in db.session.query(TelegramOutbox.id)
+                .filter(TelegramOutbox.status == "pending", TelegramOutbox.next_attempt_at <= now)
+                .order_by(TelegramOutbox.id.asc())
+                .limit(self.batch_size)
+            ]
+
+            for row_id in due_ids:
+                if not self._claim(row_id, datetime.utcnow()):
+                    continue
+
+                try:
+                    sent += self._deliver(db.session.get(TelegramOutbox, row_id))
+                except Exception as e:
+                    # битый payload, ошибка БД и т.п. — та же логика попыток, что и для ошибок API
+                    db.session.rollback()
+                    logger.exception("TG outbox #%s error", row_id)
+                    self._record_result(db.session.get(TelegramOutbox, row_id), False, None, repr(e))
+                db.session.commit()
+            db.session.remove()
+        return sent
+
+    def _deliver(self, row: TelegramOutbox) -> int:
+        # attempts уже увеличен захватом: строку, которая роняла процесс, больше не шлём
+        if row.attempts > TG_OUTBOX_MAX_ATTEMPTS:
+            self._record_result(row, False, -1, row.last_error or "max attempts exceeded")
+            return 0
+
+        payload = json.loads(row.payload)
+        self._throttle()
+        ok, retry_after, error = self._post(row.method, payload)
+        self._record_result(row, ok, retry_after, error)
+        return 1 if ok else 0
+
+    def _record_result(self, row: TelegramOutbox, ok: bool, retry_after, error):
+        if ok:
+            row.status = "sent"
+            row.sent_at = datetime.utcnow()
+            row.last_error = None
+        elif retry_after == -1 or row.attempts >= TG_OUTBOX_MAX_ATTEMPTS:
+            row.status = "failed"
+            row.last_error = (error or "")[:500]
+            logger.error("TG outbox #%s failed: %s", row.id, error)
+        else:
+            delay = retry_after or min(2 ** row.attempts + random.random(), TG_OUTBOX_MAX_BACKOFF_SEC)
+            row.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+            row.last_error = (error or "")[:500]
+            logger.warning("TG outbox #%s retry in %.1fs: %s", row.id, delay, error)
+
+    def run_forever(self, stop: threading.Event = None):
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("TG outbox dispatcher error")
+            self._wake.wait(TG_OUTBOX_POLL_SEC)
+            self._wake.clear()
+
+    # ---------- фоновый поток ----------
+    def wake(self):
+        self._wake.set()
+
+    def ensure_started(self):
+        # поток живёт в каждом воркере; после fork стартуем заново
+        if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self.run_forever, name="tg-outbox", daemon=True)
+        self._thread.start()
+
+
+tg_outbox = TelegramOutboxDispatcher(app)
+
+
+@app.before_request
+def start_tg_outbox():
+    if TG_OUTBOX_WORKER == "thread":
+        tg_outbox.ensure_started()
+
+
+@app.cli.command("tg-outbox")
+def tg_outbox_command():
+    """Отдельный процесс-диспетчер (тогда воркерам ставим TG_OUTBOX_WORKER=off)."""
+    tg_outbox.run_forever()
+
+
+# ======================
+# CONSTANTS (ORDERS)
+# ======================
+
+# Заголовки таблицы заказов
+ORDER_TABLE_LABELS = {
+    "order":   {"ru": "Заказ",   "lv": "Pasūtījums", "en": "Order"},
+    "address": {"ru": "Адрес",   "lv": "Adrese",     "en": "Address"},
+    "time":    {"ru": "Время",   "lv": "Laiks",      "en": "Time"},
+    "courier": {"ru": "Курьер",  "lv": "Kurjers",    "en": "Courier"},
+    "status":  {"ru": "Статус",  "lv": "Statuss",    "en": "Status"},
+}
+
+# Каноничные статусы (ТОЛЬКО ОНИ)
+ORDER_STATUSES = {
+    "new": {"ru": "Новый", "lv": "Jauns", "en": "New"},
+    "confirmed": {"ru": "Подтверждён", "lv": "Apstiprināts", "en": "Confirmed"},
+
+    "courier_picked": {"ru": "Курьер забрал", "lv": "Kurjers paņēma", "en": "Courier picked up"},
+    "courier_on_way": {"ru": "Курьер в пути", "lv": "Kurjers ceļā", "en": "Courier on the way"},
+    "courier_arrived": {"ru": "Курьер на месте", "lv": "Kurjers ieradies", "en": "Courier arrived"},
+
+    "completed": {"ru": "Завершён", "lv": "Pabeigts", "en": "Completed"},
+    "canceled": {"ru": "Отменён", "lv": "Atcelts", "en": "Canceled"},
+}
+
+ALLOWED_STATUS_TRANSITIONS = {
+    "new": ["confirmed", "canceled"],
+    "confirmed": ["courier_picked", "canceled"],
+    "courier_picked": ["courier_on_way", "canceled"],
+    "courier_on_way": ["courier_arrived", "canceled"],
+    "courier_arrived": ["completed", "canceled"],
+    "completed": [],
+    "canceled": [],
+}
 
 # Алиасы старых статусов (чтобы ничего не сломалось)
 STATUS_ALIASES = {
@@ -676,6 +1518,10 @@ TRANSLATIONS = {
     "print": {"ru": "Печать", "en": "Print", "lv": "Drukāt"},
     "no_orders": {"ru": "Нет заказов", "en": "No orders", "lv": "Nav pasūtījumu"},
     "to_archive": {"ru": "В архив", "en": "To archive", "lv": "Uz arhīvu"},
+    "page_newer": {"ru": "Новее", "en": "Newer", "lv": "Jaunāki"},
+    "page_older": {"ru": "Старее", "en": "Older", "lv": "Vecāki"},
+    "orders_total": {"ru": "Всего заказов", "en": "Total orders", "lv": "Kopā pasūtījumi"},
+    "show_count": {"ru": "Показать количество", "en": "Show count", "lv": "Rādīt skaitu"},
 
     "confirm_restore_order": {
         "ru": "Восстановить заказ из архива?",
@@ -769,28 +1615,52 @@ TRANSLATIONS = {
     "timeline_canceled": {"ru": "Отменён", "lv": "Atcelts", "en": "Canceled"},
     }
 
+# ======================
+# PERF-15: PRECOMPILED TRANSLATIONS
+# ======================
+def _compile_translations() -> dict:
+    """TRANSLATIONS -> {lang: {key: text}} с уже разрешённой цепочкой fallback (lang → ru → lv → en → key)."""
+    return {
+        lang: {
+            key: pack.get(lang) or pack.get("ru") or pack.get("lv") or pack.get("en") or key
+            for key, pack in TRANSLATIONS.items()
+        }
+        for lang in SUPPORTED_LANGS
+    }
+
+
+TRANSLATIONS_BY_LANG = _compile_translations()
+
+
 def t(key: str, lang: str = None) -> str:
-    lang = (lang or session.get("lang", "ru")).lower()
-    if lang not in SUPPORTED_LANGS:
-        lang = "ru"
+    lang = lang or session.get("lang", "ru")
+    table = TRANSLATIONS_BY_LANG.get(lang) or TRANSLATIONS_BY_LANG.get(str(lang).lower()) or TRANSLATIONS_BY_LANG["ru"]
+    return table.get(key, key)
 
-    pack = TRANSLATIONS.get(key)
-    if not pack:
-        return key
 
-    return pack.get(lang) or pack.get("ru") or pack.get("lv") or pack.get("en") or key
+def _make_translator(lang: str):
+    table = TRANSLATIONS_BY_LANG[lang]
 
+    def translate(key: str, lang: str = None) -> str:
+        if lang:
+            return t(key, lang)
+        return table.get(key, key)
 
-@app.context_processor
-def inject_i18n():
-    return {
-        "lang": session.get("lang", "ru"),
-        "t": t,
-        "ORDER_STATUSES": ORDER_STATUSES,
-        "ORDER_TABLE_LABELS": ORDER_TABLE_LABELS,
-        "ALLOWED_STATUS_TRANSITIONS": ALLOWED_STATUS_TRANSITIONS,
-        "normalize_order_status": normalize_order_status,
-    }
+    return translate
+
+
+# t() для шаблонов, уже привязанный к языку: выбирается один раз на запрос
+TRANSLATORS = {lang: _make_translator(lang) for lang in SUPPORTED_LANGS}
+
+
+# константы и хелперы — один раз в globals Jinja, а не в каждом рендере
+app.jinja_env.globals.update(
+    t=t,
+    ORDER_STATUSES=ORDER_STATUSES,
+    ORDER_TABLE_LABELS=ORDER_TABLE_LABELS,
+    ALLOWED_STATUS_TRANSITIONS=ALLOWED_STATUS_TRANSITIONS,
+    normalize_order_status=normalize_order_status,
+)
 
 TIMELINE_STEPS = [
     ("new", "timeline_new"),
@@ -825,9 +1695,7 @@ def timeline_flags(current_status: str):
     return out
 
 
-@app.context_processor
-def inject_timeline_helpers():
-    return {"timeline_flags": timeline_flags}
+app.jinja_env.globals.update(timeline_flags=timeline_flags)
 # ======================
 # CORE-5: FORMAT HELPERS
 # ======================
@@ -845,35 +1713,26 @@ def fmt_dt(dt):
         return ""
 
 
-@app.context_processor
-def inject_formatters():
-    return dict(fmt_money=fmt_money, fmt_dt=fmt_dt)
+app.jinja_env.globals.update(fmt_money=fmt_money, fmt_dt=fmt_dt)
 
 
-# CSRF token into templates
-@app.context_processor
-def inject_csrf_token():
+# CSRF token into templates (создаётся, только если шаблон его выводит)
+def _ctx_csrf_token():
     if "csrf_token" not in session:
         session["csrf_token"] = secrets.token_hex(16)
-    return dict(csrf_token=session["csrf_token"])
+    return session["csrf_token"]
 
 
-@app.context_processor
-def inject_cart_total():
+def _ctx_cart_total():
     cart = session.get("cart", {})
-    return dict(cart_total_items=sum(cart.values()))
+    return sum(cart.values())
 
-@app.context_processor
-def inject_categories_menu():
+
+def _ctx_categories_menu():
     try:
-        cats = (
-            Category.query.filter_by(is_active=True)
-            .order_by(Category.sort.asc(), Category.id.asc())
-            .all()
-        )
+        return category_menu_cache.get()
     except Exception:
-        cats = []
-    return dict(menu_categories=cats)
+        return []
 
 # ======================
 # CORE-16: BREADCRUMBS
@@ -894,13 +1753,11 @@ BREADCRUMBS_MAP = {
 }
 
 
-def build_breadcrumbs():
-    lang = session.get("lang", "ru")
-    endpoint = request.endpoint
-    if not endpoint or endpoint not in BREADCRUMBS_MAP:
-        return []
+_breadcrumbs_table = {}  # (endpoint, lang) -> [(title, endpoint | None)]; заполняется на старте
 
-    crumbs = []
+
+def _breadcrumb_trail(endpoint: str, lang: str):
+    trail = []
     seen = set()
     cur = endpoint
 
@@ -908,88 +1765,1326 @@ def build_breadcrumbs():
         seen.add(cur)
         title_dict, parent = BREADCRUMBS_MAP[cur]
         title = title_dict.get(lang, title_dict.get("ru", cur))
+        trail.append((title, cur if cur in app.view_functions else None))
+        cur = parent
+
+    trail.reverse()
+    return trail
+
+
+def precompute_breadcrumbs():
+    # на старте — только цепочки заголовков; URL строит url_for в запросе (SCRIPT_NAME, префикс)
+    for endpoint in BREADCRUMBS_MAP:
+        for lang in SUPPORTED_LANGS:
+            _breadcrumbs_table[(endpoint, lang)] = _breadcrumb_trail(endpoint, lang)
+
+
+def build_breadcrumbs():
+    lang = session.get("lang", "ru")
+    endpoint = request.endpoint
+    if not endpoint or endpoint not in BREADCRUMBS_MAP:
+        return []
+
+    trail = _breadcrumbs_table.get((endpoint, lang))
+    if trail is None:
+        trail = _breadcrumbs_table[(endpoint, lang)] = _breadcrumb_trail(endpoint, lang)
+    return [{"title": title, "url": url_for(ep, lang=lang) if ep else "#"} for title, ep in trail]
+
+
+# ======================
+# PERF-14: LAZY TEMPLATE CONTEXT
+# ======================
+def _lazy(name: str, fn):
+    """Значение для шаблона, которое считается при первом обращении (один раз за запрос)."""
+
+    def resolve():
+        cache = g.setdefault("_lazy_ctx", {})
+        if name not in cache:
+            cache[name] = fn()
+        return cache[name]
+
+    return LocalProxy(resolve)
+
+
+_LAZY_CONTEXT = {
+    "csrf_token": _lazy("csrf_token", _ctx_csrf_token),
+    "cart_total_items": _lazy("cart_total_items", _ctx_cart_total),
+    "menu_categories": _lazy("menu_categories", _ctx_categories_menu),
+    "breadcrumbs": _lazy("breadcrumbs", build_breadcrumbs),
+}
+
+
+@app.context_processor
+def inject_template_context():
+    lang = session.get("lang", "ru")
+    return {"lang": lang, "t": TRANSLATORS.get(lang) or TRANSLATORS["ru"], **_LAZY_CONTEXT}
+# ======================
+# SECURITY-35: ADMIN AUDIT LOG
+# ======================
+def audit_admin(action: str, entity: str = None, entity_id: int = None, details: str = None):
+    try:
+        username = getattr(current_user, "username", "unknown")
+        ip = request.headers.get("X-Forwarded-For", request.remote_addr)
+        if ip and "," in ip:
+            ip = ip.split(",")[0].strip()
+        ua = (request.headers.get("User-Agent", "") or "")[:255]
+
+        row = AdminAuditLog(
+            admin_username=username,
+            action=action,
+            entity=entity,
+            entity_id=entity_id,
+            ip=ip,
+            user_agent=ua,
+            details=(details or "")[:4000],
+        )
+        db.session.add(row)
+        db.session.commit()
+    except Exception:
         try:
-            url = url_for(cur, lang=lang)
+            db.session.rollback()
         except Exception:
-            url = "#"
-        crumbs.append({"title": title, "url": url})
-        cur = parent
+            pass
+
+
+# ======================
+# SECURITY: BLOCK EMPTY CHECKOUT
+# ======================
+@app.before_request
+def block_empty_checkout():
+    if request.endpoint == "checkout" and request.method == "POST":
+        cart = session.get("cart", {})
+        if not cart or sum(cart.values()) == 0:
+            return redirect(url_for("cart"))
+
+
+# CSRF protect all /admin POST
+@app.before_request
+def csrf_protect_admin():
+    if request.method == "POST" and request.path.startswith("/admin"):
+        form_token = request.form.get("csrf_token")
+        session_token = session.get("csrf_token")
+        if not form_token or not session_token or form_token != session_token:
+            flash("CSRF ошибка. Обновите страницу.", "error")
+            return redirect(url_for("admin_orders"))
+
+
+# ======================
+# PERF-19: RESPONSIVE IMAGE VARIANTS (WEBP/AVIF, фоновая генерация)
+# ======================
+IMAGE_VARIANT_WIDTHS = tuple(
+    int(w) for w in os.getenv("IMAGE_VARIANT_WIDTHS", "320,640,1280").split(",") if w.strip()
+)
+IMAGE_WEBP_QUALITY = int(os.getenv("IMAGE_WEBP_QUALITY", "80"))
+# AVIF кодируется в разы дольше WEBP — включается явно
+IMAGE_AVIF = os.getenv("IMAGE_AVIF", "0") == "1" and features.check("avif")
+IMAGE_AVIF_QUALITY = int(os.getenv("IMAGE_AVIF_QUALITY", "55"))
+
+
+class KeyedLock:
+    """Лок на ключ: задачи с одним ключом идут по очереди, с разными — параллельно."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = {}  # key -> [lock, waiters]
+
+    @contextmanager
+    def __call__(self, key):
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    self._locks.pop(key, None)
+
+
+_image_variant_locks = KeyedLock()
+
+IMAGE_LQIP_SIZE = 16
+IMAGE_LQIP_MAX_BYTES = 1024
+
+
+def build_image_lqip(im) -> str:
+    """Размытая миниатюра 16px -> data:image/webp;base64 (инлайнится в HTML каталога)."""
+    small = im.convert("RGB")
+    small.thumbnail((IMAGE_LQIP_SIZE, IMAGE_LQIP_SIZE), Image.BILINEAR)
+    small = small.filter(ImageFilter.GaussianBlur(1))
+
+    for quality in (40, 25, 10):
+        buf = BytesIO()
+        small.save(buf, "WEBP", quality=quality)
+        uri = "data:image/webp;base64," + base64.b64encode(buf.getvalue()).decode("ascii")
+        if len(uri) <= IMAGE_LQIP_MAX_BYTES:
+            return uri
+    return None
+
+
+def build_image_variants(image: str):
+    """
+    static/<image> -> <name>.w<width>.webp (+ .avif) рядом с оригиналом.
+    Исходник декодируется один раз; ширины больше оригинала не генерируются.
+    Возвращает (варианты, meta): meta — lqip и размеры оригинала.
+    """
+    src_path = os.path.join(app.static_folder, image)
+    base = os.path.splitext(image)[0]
+    formats = [("webp", "WEBP", {"quality": IMAGE_WEBP_QUALITY, "method": 6})]
+    if IMAGE_AVIF:
+        formats.append(("avif", "AVIF", {"quality": IMAGE_AVIF_QUALITY}))
+
+    result = {fmt: [] for fmt, _, _ in formats}
+    with Image.open(src_path) as im:
+        im = ImageOps.exif_transpose(im)
+        im = im.convert("RGBA" if im.mode in ("RGBA", "LA", "P") else "RGB")
+        meta = {"lqip": build_image_lqip(im), "width": im.width, "height": im.height}
+
+        widths = sorted({w for w in IMAGE_VARIANT_WIDTHS if w < im.width} | {min(im.width, max(IMAGE_VARIANT_WIDTHS))})
+        for width in widths:
+            height = max(1, round(im.height * width / im.width))
+            resized = im if width == im.width else im.resize((width, height), Image.LANCZOS)
+            for fmt, pil_format, options in formats:
+                rel = f"{base}.w{width}.{fmt}"
+                dst = os.path.join(app.static_folder, rel)
+                tmp = f"{dst}.{uuid.uuid4().hex}.tmp"
+                resized.save(tmp, pil_format, **options)
+                os.replace(tmp, dst)
+                result[fmt].append([width, rel])
+    return result, meta
+
+
+def image_meta_values(meta: dict) -> dict:
+    meta = meta or {}
+    return {"image_lqip": meta.get("lqip"), "image_width": meta.get("width"), "image_height": meta.get("height")}
+
+
+def shared_image_variants(image: str):
+    """
+    Готовые варианты той же картинки у другого товара (или None): нужны все поля
+    и файлы на диске — иначе копировать нечего, генерируем заново.
+    """
+    rows = (
+        db.session.query(Product.image_variants, Product.image_lqip, Product.image_width, Product.image_height)
+        .filter(
+            Product.image == image,
+            Product.image_variants.isnot(None),
+            Product.image_lqip.isnot(None),
+            Product.image_width.isnot(None),
+            Product.image_height.isnot(None),
+        )
+        .limit(5)
+        .all()
+    )
+    for row in rows:
+        try:
+            variants = json.loads(row.image_variants)
+        except ValueError:
+            continue
+        if _variants_exist(variants):
+            return row
+    return None
+
+
+def generate_product_variants(product_id: int):
+    """Фоновая задача: варианты картинки товара -> product.image_variants."""
+    product = Product.query.get(product_id)
+    if not product or not product.image:
+        return
+
+    image = product.image
+    started = time.perf_counter()
+
+    # один blob — одна генерация: задачи для товаров с той же картинкой ждут и берут готовое
+    with _image_variant_locks(image):
+        done = shared_image_variants(image)
+        if done:
+            values = dict(done._mapping)
+        else:
+            variants, meta = build_image_variants(image)
+            values = dict(image_variants=json.dumps(variants), **image_meta_values(meta))
+
+        # картинку могли поменять, пока шла генерация — тогда результат уже не нужен
+        updated = db.session.execute(
+            update(Product)
+            .where(Product.id == product_id, Product.image == image)
+            .values(**values)
+        ).rowcount
+        db.session.commit()
+
+    if updated:
+        catalog_changed()
+    logger.info(
+        "image variants %s: %.0f ms%s", image, (time.perf_counter() - started) * 1000, " (reused)" if done else ""
+    )
+
+
+# ======================
+# PERF-20: BULK IMAGE OPTIMIZATION (flask images-optimize)
+# ======================
+IMAGE_OPTIMIZE_DIRS = ("images", "uploads")
+IMAGE_SOURCE_EXTS = {".png", ".jpg", ".jpeg", ".webp"}
+_VARIANT_NAME_RE = re.compile(r"\.w\d+\.(webp|avif)$")
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _optimize_image_job(image: str):
+    # выполняется в дочернем процессе
+    try:
+        variants, meta = build_image_variants(image)
+        return image, variants, meta, None
+    except Exception as e:
+        return image, None, None, str(e)
+
+
+def _variants_exist(variants: dict) -> bool:
+    return bool(variants) and all(
+        os.path.exists(os.path.join(app.static_folder, path))
+        for items in variants.values() for _, path in items
+    )
+
+
+def optimize_static_images(workers: int = None) -> dict:
+    """
+    Варианты для всех картинок в static/images и static/uploads.
+    Манифест (путь -> size/mtime/sha256/variants) делает повторный запуск инкрементальным:
+    неизменённые файлы — один stat(), без чтения; одинаковое содержимое кодируется один раз.
+    """
+    manifest_path = os.path.join(CACHE_DIR, "images-manifest.json")
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    by_hash = {e["sha256"]: e for e in manifest.values() if e.get("variants")}
+    pending, seen = {}, set()
+    stats = {"files": 0, "encoded": 0, "skipped": 0, "failed": 0, "bytes_before": 0, "bytes_after": 0}
+
+    for folder in IMAGE_OPTIMIZE_DIRS:
+        for dirpath, _, files in os.walk(os.path.join(app.static_folder, folder)):
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() not in IMAGE_SOURCE_EXTS or _VARIANT_NAME_RE.search(name):
+                    continue
+                path = os.path.join(dirpath, name)
+                image = os.path.relpath(path, app.static_folder).replace(os.sep, "/")
+                st = os.stat(path)
+                seen.add(image)
+                stats["files"] += 1
+
+                entry = manifest.get(image)
+                if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns \
+                        and (entry.get("failed") or (_variants_exist(entry.get("variants")) and "meta" in entry)):
+                    stats["skipped"] += 1
+                    continue
+
+                digest = _file_sha256(path)
+                entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest, "variants": None}
+                manifest[image] = entry
+                done = by_hash.get(digest)
+                if done and done is not entry and _variants_exist(done["variants"]) and "meta" in done:
+                    # тот же файл под другим именем — переиспользуем готовые варианты
+                    entry["variants"], entry["meta"] = done["variants"], done["meta"]
+                    stats["skipped"] += 1
+                    continue
+                pending.setdefault(digest, []).append(image)
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            jobs = [images[0] for images in pending.values()]
+            for image, variants, meta, error in pool.map(_optimize_image_job, jobs):
+                stats["failed" if error else "encoded"] += 1
+                if error:
+                    logger.warning("images-optimize %s: %s", image, error)
+                for same in pending[manifest[image]["sha256"]]:
+                    # битый файл не перечитываем, пока он не изменится
+                    manifest[same]["variants"] = variants
+                    manifest[same]["meta"] = meta
+                    manifest[same]["failed"] = bool(error)
+
+    # удалённые файлы — из манифеста
+    for image in set(manifest) - seen:
+        del manifest[image]
+
+    for entry in manifest.values():
+        if entry.get("variants"):
+            largest = entry["variants"]["webp"][-1][1]
+            stats["bytes_before"] += entry["size"]
+            stats["bytes_after"] += os.path.getsize(os.path.join(app.static_folder, largest))
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, manifest_path)
+
+    # товарам без вариантов / заглушки — проставляем из манифеста
+    updated = 0
+    missing = or_(Product.image_variants.is_(None), Product.image_lqip.is_(None))
+    for product in Product.query.filter(missing, Product.image.isnot(None)).all():
+        entry = manifest.get(product.image)
+        if entry and entry.get("variants"):
+            product.image_variants = json.dumps(entry["variants"])
+            for key, value in image_meta_values(entry.get("meta")).items():
+                setattr(product, key, value)
+            updated += 1
+    db.session.commit()
+    if updated:
+        catalog_changed()
+    stats["products"] = updated
+    return stats
+
+
+@app.cli.command("images-optimize")
+@click.option("--workers", type=int, default=None, help="Число процессов (по умолчанию — все ядра).")
+def images_optimize_command(workers):
+    started = time.perf_counter()
+    st = optimize_static_images(workers)
+    saved = st["bytes_before"] - st["bytes_after"]
+    print(
+        f"images: {st['files']} files, {st['encoded']} encoded, {st['skipped']} unchanged, "
+        f"{st['failed']} failed, {st['products']} products updated"
+    )
+    print(
+        f"bytes: {st['bytes_before']} -> {st['bytes_after']} (largest webp), saved {saved} "
+        f"in {time.perf_counter() - started:.1f} s"
+    )
+
+
+# ======================
+# PERF-22: CONTENT-ADDRESSED UPLOADS (sha256 + refcount)
+# ======================
+UPLOAD_CHUNK_SIZE = 64 * 1024
+UPLOAD_SWEEP_GRACE_SEC = int(os.getenv("UPLOAD_SWEEP_GRACE_SEC", "300"))
+UPLOAD_SWEEP_INTERVAL_SEC = int(os.getenv("UPLOAD_SWEEP_INTERVAL_SEC", "600"))  # 0 — только CLI
+_CONTENT_ADDRESSED_RE = re.compile(r"^uploads/[0-9a-f]{64}\.[a-z0-9]+$")
+
+
+def is_content_addressed(path: str) -> bool:
+    return bool(path and _CONTENT_ADDRESSED_RE.match(path))
+
+
+def _acquire_blob(digest: str, path: str, size: int) -> str:
+    """refcount+1 существующего blob'а или новый blob. Возвращает его путь."""
+    for _ in range(2):
+        res = db.session.execute(
+            update(UploadBlob)
+            .where(UploadBlob.sha256 == digest)
+            .values(refcount=UploadBlob.refcount + 1, orphaned_at=None)
+        )
+        if res.rowcount:
+            return db.session.query(UploadBlob.path).filter_by(sha256=digest).scalar()
+        try:
+            # savepoint: при конфликте откатывается только вставка, а не вся работа вызывающего
+            with db.session.begin_nested():
+                db.session.add(UploadBlob(sha256=digest, path=path, size=size, refcount=1))
+            return path
+        except IntegrityError:
+            pass  # тот же файл параллельно загрузил кто-то ещё — на втором круге берём его blob
+    raise RuntimeError(f"upload blob {digest}: insert race")
+
+
+def store_upload(file) -> str:
+    """
+    Загрузка -> static/uploads/<sha256>.<ext>: поток пишется во временный файл с хэшированием
+    по ходу записи, потом rename. Одинаковые файлы хранятся один раз.
+    До записи на диск проверяется заголовок (read_image_header) — иначе UploadRejected.
+    Транзакцию (refcount) коммитит вызывающий — вместе с товаром.
+    """
+    ext = file.filename.rsplit(".", 1)[1].lower()
+    head = read_image_header(file.stream, ext)
+    max_bytes = app.config.get("MAX_CONTENT_LENGTH") or float("inf")
+
+    folder = os.path.join(app.static_folder, "uploads")
+    os.makedirs(folder, exist_ok=True)
+    tmp = os.path.join(folder, f".{uuid.uuid4().hex}.tmp")
+
+    h = hashlib.sha256(head)
+    size = len(head)
+    try:
+        with open(tmp, "wb") as out:
+            out.write(head)
+            for chunk in iter(lambda: file.stream.read(UPLOAD_CHUNK_SIZE), b""):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadRejected("Файл слишком большой")
+                h.update(chunk)
+                out.write(chunk)
+
+        digest = h.hexdigest()
+        path = _acquire_blob(digest, f"uploads/{digest}.{ext}", size)
+        # rename и для уже существующего blob'а: файл мог успеть удалить sweep
+        os.replace(tmp, os.path.join(app.static_folder, path))
+        return path
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def retain_upload(path: str):
+    if path:
+        db.session.execute(
+            update(UploadBlob)
+            .where(UploadBlob.path == path)
+            .values(refcount=UploadBlob.refcount + 1, orphaned_at=None)
+        )
+
+
+def release_upload(path: str):
+    if not path:
+        return
+    db.session.execute(
+        update(UploadBlob)
+        .where(UploadBlob.path == path, UploadBlob.refcount > 0)
+        .values(refcount=UploadBlob.refcount - 1)
+    )
+    db.session.execute(
+        update(UploadBlob)
+        .where(UploadBlob.path == path, UploadBlob.refcount == 0, UploadBlob.orphaned_at.is_(None))
+        .values(orphaned_at=datetime.utcnow())
+    )
+
+
+_UPLOAD_FILE_RE = re.compile(r"^(?P<sha>[0-9a-f]{64})(?:\.w\d+)?\.[a-z0-9]+$")
+
+
+def _blob_files(rel: str) -> list:
+    base = os.path.splitext(os.path.join(app.static_folder, rel))[0]
+    return [os.path.join(app.static_folder, rel)] + glob.glob(f"{base}.w*.*")
+
+
+def _remove_if_unchanged(path: str, st) -> bool:
+    """
+    Удаляет path, если это всё ещё тот же файл (inode/mtime из st).
+    Файл сначала уводится в сторону: если за это время загрузка положила его заново
+    (os.replace — новый inode), возвращаем на место — содержимое по sha то же самое.
+    """
+    tomb = os.path.join(os.path.dirname(path), f".{uuid.uuid4().hex}.tmp")
+    try:
+        os.rename(path, tomb)
+    except OSError:
+        return False
+    moved = os.stat(tomb)
+    if (moved.st_ino, moved.st_mtime_ns) != (st.st_ino, st.st_mtime_ns):
+        os.replace(tomb, path)
+        return False
+    os.remove(tomb)
+    return True
+
+
+def _sweep_untracked_uploads(folder: str, cutoff_ts: float) -> int:
+    """<sha>.<ext> и <sha>.w*.* без строки UploadBlob (упавшая загрузка, удалённая вручную строка)."""
+    old = {}
+    try:
+        with os.scandir(folder) as it:
+            for entry in it:
+                m = _UPLOAD_FILE_RE.match(entry.name)
+                if not m:
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                if st.st_mtime < cutoff_ts:
+                    old.setdefault(m.group("sha"), []).append((entry.path, st))
+    except FileNotFoundError:
+        return 0
+
+    removed = 0
+    digests = list(old)
+    for i in range(0, len(digests), 500):
+        batch = digests[i:i + 500]
+        tracked = {
+            d for (d,) in db.session.query(UploadBlob.sha256).filter(UploadBlob.sha256.in_(batch))
+        }
+        for digest in batch:
+            if digest in tracked:
+                continue
+            for path, st in old[digest]:
+                try:
+                    removed += _remove_if_unchanged(path, st)
+                except OSError:
+                    pass
+    db.session.rollback()
+    return removed
+
+
+def sweep_upload_blobs(grace_sec: int = None) -> int:
+    """
+    Удаляет blob'ы без ссылок старше grace_sec (+ их webp-варианты), файлы uploads/
+    без строки UploadBlob старше grace_sec и брошенные .tmp. Возвращает число удалённых blob'ов.
+    """
+    grace = UPLOAD_SWEEP_GRACE_SEC if grace_sec is None else grace_sec
+    cutoff = datetime.utcnow() - timedelta(seconds=grace)
+    removed = 0
+
+    candidates = (
+        db.session.query(UploadBlob.sha256, UploadBlob.path)
+        .filter(UploadBlob.refcount == 0, UploadBlob.orphaned_at <= cutoff)
+        .limit(500)
+        .all()
+    )
+    db.session.rollback()
+    for digest, rel in candidates:
+        # условный DELETE (ссылок так и не появилось) держит блокировку строки (в SQLite — всей базы)
+        # до commit: загрузка того же файла ждёт в _acquire_blob и кладёт файл уже после нас.
+        # Поэтому файлы удаляются ДО commit, а не после
+        res = db.session.execute(
+            db.delete(UploadBlob).where(
+                UploadBlob.sha256 == digest, UploadBlob.refcount == 0, UploadBlob.orphaned_at <= cutoff
+            )
+        )
+        if not res.rowcount:
+            db.session.rollback()
+            continue
+
+        for path in _blob_files(rel):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        db.session.commit()
+        removed += 1
+
+    folder = os.path.join(app.static_folder, "uploads")
+    untracked = _sweep_untracked_uploads(folder, time.time() - grace)
+
+    for path in glob.glob(os.path.join(folder, ".*.tmp")):
+        try:
+            if os.path.getmtime(path) < time.time() - max(grace, 3600):
+                os.remove(path)
+        except OSError:
+            pass
+
+    if removed or untracked:
+        logger.info("upload sweep: %s blobs, %s untracked files removed", removed, untracked)
+    return removed
+
+
+_upload_sweep_next = 0.0
+
+
+@app.before_request
+def schedule_upload_sweep():
+    # периодическая чистка в каждом воркере (параллельные проходы безопасны: DELETE условный)
+    global _upload_sweep_next
+    if not UPLOAD_SWEEP_INTERVAL_SEC or time.monotonic() < _upload_sweep_next:
+        return
+    _upload_sweep_next = time.monotonic() + UPLOAD_SWEEP_INTERVAL_SEC
+    submit_background(sweep_upload_blobs)
+
+
+@app.cli.command("uploads-sweep")
+@click.option("--grace", type=int, default=None, help="Сколько секунд blob должен пробыть без ссылок.")
+def uploads_sweep_command(grace):
+    print(f"upload blobs removed: {sweep_upload_blobs(grace)}")
+
+
+# ======================
+# PERF-23: UPLOAD VALIDATION (сигнатура + размеры до записи на диск)
+# ======================
+UPLOAD_MAX_PIXELS = int(os.getenv("UPLOAD_MAX_PIXELS", str(40 * 1000 * 1000)))
+UPLOAD_MAX_SIDE = int(os.getenv("UPLOAD_MAX_SIDE", "10000"))
+UPLOAD_HEADER_MAX_BYTES = 512 * 1024  # у JPEG размеры (SOF) могут стоять после большого EXIF
+UPLOAD_FORMAT_EXTS = {"PNG": {"png"}, "JPEG": {"jpg", "jpeg"}, "WEBP": {"webp"}}
+
+# Pillow откажется декодировать «бомбу» и в фоновых задачах (варианты, /img)
+Image.MAX_IMAGE_PIXELS = UPLOAD_MAX_PIXELS
+
+
+class UploadRejected(ValueError):
+    """Загрузка отклонена; текст — для flash()."""
+
+
+def sniff_image_format(head: bytes):
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "PNG"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "JPEG"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP"
+    return None
+
+
+def read_image_header(stream, ext: str) -> bytes:
+    """
+    Читает начало потока, пока Pillow не разберёт заголовок (без декодирования пикселей).
+    Проверяет сигнатуру, соответствие расширению и размеры. Возвращает прочитанные байты.
+    """
+    head = b""
+    fmt = None
+    while True:
+        chunk = stream.read(UPLOAD_CHUNK_SIZE)
+        head += chunk
+
+        if fmt is None and (len(head) >= 12 or not chunk):
+            fmt = sniff_image_format(head)
+            if fmt is None or ext not in UPLOAD_FORMAT_EXTS[fmt]:
+                raise UploadRejected("Файл не является изображением PNG/JPG/WEBP")
+
+        if fmt is not None:
+            try:
+                with Image.open(BytesIO(head), formats=[fmt]) as im:
+                    width, height = im.size
+                break
+            except Image.DecompressionBombError:
+                raise UploadRejected("Изображение слишком большое")
+            except Exception:
+                pass  # заголовок ещё не дочитан
+
+        if not chunk or len(head) >= UPLOAD_HEADER_MAX_BYTES:
+            raise UploadRejected("Не удалось прочитать изображение")
+
+    if width * height > UPLOAD_MAX_PIXELS or max(width, height) > UPLOAD_MAX_SIDE:
+        raise UploadRejected(f"Изображение слишком большое ({width}×{height})")
+    return head
+
+
+# ======================
+# PERF-1: CACHE VERSIONS + CATALOG CACHE
+# ======================
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join("data", "cache"))
+
+
+class VersionStamp:
+    """
+    Версия данных, общая для всех gunicorn-воркеров.
+    Хранится как mtime файла в CACHE_DIR: чтение = один stat(), без БД.
+    """
+
+    def __init__(self, name: str):
+        self.path = os.path.join(CACHE_DIR, f"{name}.version")
+
+    def get(self) -> int:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return 0
+
+    def bump(self) -> int:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        new = max(time.time_ns(), self.get() + 1)
+        with open(self.path, "a"):
+            pass
+        os.utime(self.path, ns=(new, new))
+        return new
+
+
+catalog_version = VersionStamp("catalog")
+
+
+class CatalogCache:
+    """
+    Отрендеренные фрагменты каталога: (lang, version) -> html.
+    Старые версии выбрасываются при первом промахе по новой версии.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, lang: str, render):
+        key = (lang, catalog_version.get())
+        html = self._items.get(key)
+        if html is not None:
+            self.hits += 1
+            return html
+
+        html = render()
+        with self._lock:
+            self.misses += 1
+            self._items = {k: v for k, v in self._items.items() if k[1] == key[1]}
+            self._items[key] = html
+        return html
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._items), "version": catalog_version.get()}
+
+
+catalog_cache = CatalogCache()
+
+
+def catalog_changed():
+    try:
+        catalog_version.bump()
+    except OSError:
+        logger.exception("catalog version bump failed")
+
+
+# ======================
+# PERF-13: CATEGORY MENU CACHE
+# ======================
+CATEGORY_CACHE_TTL_SEC = int(os.getenv("CATEGORY_CACHE_TTL_SEC", "300"))
+
+categories_version = VersionStamp("categories")
+
+
+class CategoryMenuCache:
+    """
+    Активные категории в памяти процесса. Перечитываются из БД,
+    когда сменилась categories_version или истёк TTL.
+    Хранятся копии (SimpleNamespace), а не ORM-объекты — не привязаны к сессии.
+    """
+
+    def __init__(self, ttl_sec: int = CATEGORY_CACHE_TTL_SEC):
+        self.ttl_sec = ttl_sec
+        self._items = None
+        self._version = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> list:
+        version = categories_version.get()
+        if self._items is not None and self._version == version and time.monotonic() < self._expires_at:
+            return self._items
+
+        with self._lock:
+            rows = (
+                Category.query.filter_by(is_active=True)
+                .order_by(Category.sort.asc(), Category.id.asc())
+                .all()
+            )
+            self._items = [
+                SimpleNamespace(
+                    id=c.id, slug=c.slug, title_ru=c.title_ru, title_lv=c.title_lv,
+                    title_en=c.title_en, sort=c.sort, is_active=c.is_active,
+                )
+                for c in rows
+            ]
+            self._version = version
+            self._expires_at = time.monotonic() + self.ttl_sec
+            return self._items
+
+
+category_menu_cache = CategoryMenuCache()
+
+
+def categories_changed():
+    try:
+        categories_version.bump()
+    except OSError:
+        logger.exception("categories version bump failed")
+
+
+# ======================
+# PERF-16: PRE-RENDERED STATIC PAGES
+# ======================
+class StaticPageCache:
+    """
+    Статические страницы (about/faq/...), отрендеренные один раз на
+    (страница, язык, вариант шапки, хост) и сразу сжатые в gzip/brotli.
+    LRU: при переполнении вытесняется самая давно запрошенная запись.
+    """
+
+    MAX_ENTRIES = 512
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, key, render) -> dict:
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        entry = self.build_entry(render())
+        with self._lock:
+            self.misses += 1
+            self._items[key] = entry
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def build_entry(html: str) -> dict:
+        body = html.encode("utf-8")
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        entry = {
+            "identity": (body, etag),
+            "gzip": (gzip.compress(body, compresslevel=9, mtime=0), etag + "-gz"),
+        }
+        if brotli is not None:
+            entry["br"] = (brotli.compress(body, quality=11), etag + "-br")
+        return entry
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._items)}
+
+
+static_page_cache = StaticPageCache()
+
+
+# Хосты, для которых страницы кладутся в кэш (og:url в них абсолютный).
+# Host приходит от клиента (ProxyFix x_host) — с чужим Host рендерим без кэша,
+# иначе перебором заголовка можно забить кэш и вытеснить настоящие страницы.
+PUBLIC_HOSTS = {
+    h.strip().lower()
+    for h in os.getenv("PUBLIC_HOSTS", app.config.get("SERVER_NAME") or "localhost").split(",")
+    if h.strip()
+}
+
+
+def _cacheable_host():
+    host = request.host.lower()
+    if host in PUBLIC_HOSTS or host.rsplit(":", 1)[0] in PUBLIC_HOSTS:
+        return host
+    return None
+
+
+def _header_variant() -> str:
+    """Шапка зависит только от того, кто смотрит: гость / пользователь / админ."""
+    if not current_user.is_authenticated:
+        return "anon"
+    return "admin" if current_user.role == "admin" else "user"
+
+
+def _pick_encoding(entry: dict) -> str:
+    accept = request.headers.get("Accept-Encoding", "")
+    if "br" in entry and "br" in accept:
+        return "br"
+    if "gzip" in accept:
+        return "gzip"
+    return "identity"
+
+
+def static_page(template: str):
+    lang = session.get("lang", "ru")
+    host = _cacheable_host()
+
+    # счётчик корзины в меню обновляет JS (/api/cart_count) — в кэш кладём 0
+    def render():
+        return render_template(template, lang=lang, cart_total_items=0)
+
+    if host is None:
+        entry = StaticPageCache.build_entry(render())
+    else:
+        entry = static_page_cache.get_or_render((template, lang, _header_variant(), host), render)
+
+    encoding = _pick_encoding(entry)
+    body, etag = entry[encoding]
+
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(body, mimetype="text/html")
+        if encoding != "identity":
+            resp.headers["Content-Encoding"] = encoding
+
+    resp.set_etag(etag)
+    resp.headers["Vary"] = "Accept-Encoding, Cookie"
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+
+# ======================
+# PERF-17: CONDITIONAL GET (ETag из версий, без рендера)
+# ======================
+# меняется при каждом деплое (шаблоны/код), одинаков во всех воркерах
+APP_BUILD = os.getenv("RENDER_GIT_COMMIT") or str(os.stat(__file__).st_mtime_ns)
+
+
+def make_etag(*parts) -> str:
+    return hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()[:24]
+
+
+def cart_hash(cart: dict) -> str:
+    return make_etag(*sorted((cart or {}).items()))
+
+
+def not_modified(etag: str, cache_control: str = "private, no-cache"):
+    """304, если у клиента актуальная версия; иначе None — рендерим как обычно."""
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+        return with_etag(resp, etag, cache_control)
+    return None
+
+
+def with_etag(resp, etag: str, cache_control: str = "private, no-cache"):
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = cache_control
+    return resp
+
+
+# ======================
+# PERF-18: FINGERPRINTED STATIC ASSETS
+# ======================
+# url_for('static', filename='css/style.css') -> /static/css/style.<hash>.css
+# Такие URL неизменяемы: Cache-Control immutable на год, рядом лежат .gz/.br копии.
+STATIC_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+STATIC_COMPRESSIBLE = {".css", ".js", ".svg", ".txt", ".json", ".map", ".ico", ".xml"}
+# .gz/.br к статике в фоне при старте воркера (деплой без `flask assets-build`)
+STATIC_PRECOMPRESS_ON_START = os.getenv("STATIC_PRECOMPRESS_ON_START", "1") == "1"
+_FINGERPRINT_RE = re.compile(r"^(?P<base>.+)\.(?P<hash>[0-9a-f]{10})(?P<ext>\.[A-Za-z0-9]+)?$")
+
+
+class StaticManifest:
+    """Имя файла -> имя с хэшем содержимого. Пересчёт, только если сменились mtime/размер."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._items = {}  # filename -> (mtime_ns, size, hash)
+
+    @staticmethod
+    def _hash_file(path: str) -> str:
+        h = hashlib.md5()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        return h.hexdigest()[:10]
+
+    def file_hash(self, filename: str):
+        # имя приходит из URL: только обычные файлы внутри static/, промахи не кэшируются
+        path = safe_join(self.root, filename)
+        if path is None or not os.path.isfile(path):
+            self._items.pop(filename, None)
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+
+        cached = self._items.get(filename)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+
+        digest = self._hash_file(path)
+        self._items[filename] = (st.st_mtime_ns, st.st_size, digest)
+        return digest
+
+    def fingerprinted(self, filename: str) -> str:
+        digest = self.file_hash(filename)
+        if not digest:
+            return filename
+        base, ext = os.path.splitext(filename)
+        return f"{base}.{digest}{ext}"
+
+    def iter_files(self):
+        """Относительные имена ассетов (uploads/ и готовые .gz/.br не трогаем)."""
+        for dirpath, dirs, files in os.walk(self.root):
+            if dirpath == self.root and "uploads" in dirs:
+                dirs.remove("uploads")
+            for name in files:
+                if name.endswith((".gz", ".br")) or name.startswith("."):
+                    continue
+                yield os.path.relpath(os.path.join(dirpath, name), self.root).replace(os.sep, "/")
+
+    def precompress(self) -> int:
+        """.gz/.br копии текстовых ассетов рядом с оригиналом. -> сколько файлов не удалось сжать."""
+        failed = 0
+        for filename in self.iter_files():
+            if os.path.splitext(filename)[1].lower() in STATIC_COMPRESSIBLE:
+                failed += not precompress_file(os.path.join(self.root, filename))
+        return failed
+
+    def build(self):
+        """Для `flask assets-build`: хэши ассетов + .gz/.br копии текстовых."""
+        for filename in self.iter_files():
+            self.file_hash(filename)
+        return self.precompress()
+
+
+def _is_fresh(target: str, source_mtime_ns: int) -> bool:
+    try:
+        return os.stat(target).st_mtime_ns >= source_mtime_ns
+    except OSError:
+        return False
+
+
+def precompress_file(path: str) -> bool:
+    """Пишет устаревшие/недостающие path.gz и path.br. False — записать не получилось."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+        targets = [(path + ".gz", lambda b: gzip.compress(b, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            targets.append((path + ".br", lambda b: brotli.compress(b, quality=11)))
+
+        data = None
+        for target, compress in targets:
+            if _is_fresh(target, mtime):
+                continue
+            if data is None:
+                with open(path, "rb") as f:
+                    data = f.read()
+            tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(compress(data))
+            os.replace(tmp, target)
+        return True
+    except OSError as e:
+        # read-only каталог со статикой — обычное дело в контейнере, отдаём без сжатия
+        logger.warning("precompress %s failed: %s", path, e)
+        return False
+
+
+# path -> mtime_ns исходника, для которого запись уже пробовали (удачно или нет):
+# на запросе не больше одной попытки на версию файла в процессе
+_precompress_tried = {}
+_precompress_lock = threading.Lock()
+
+
+def _claim_precompress(path: str, mtime_ns: int) -> bool:
+    with _precompress_lock:
+        if _precompress_tried.get(path) == mtime_ns:
+            return False
+        _precompress_tried[path] = mtime_ns
+        return True
+
+
+def compressed_variant(path: str, accept: str):
+    """-> (путь, encoding) свежей .br/.gz копии, которую принимает клиент, или (path, None)."""
+    wanted = [(enc, path + suffix) for enc, suffix in (("br", ".br"), ("gzip", ".gz")) if enc in accept]
+    if not wanted:
+        return path, None
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return path, None
+
+    for enc, target in wanted:
+        if _is_fresh(target, mtime):
+            return target, enc
+    # копий нет или исходник новее (деплой без assets-build) — одна попытка дописать
+    if _claim_precompress(path, mtime) and precompress_file(path):
+        for enc, target in wanted:
+            if _is_fresh(target, mtime):
+                return target, enc
+    return path, None
+
+
+static_manifest = StaticManifest(app.static_folder)
+
+
+@app.url_defaults
+def fingerprint_static_url(endpoint, values):
+    # uploads/<sha256>.ext уже адресованы содержимым — второй хэш не нужен
+    if endpoint == "static" and "filename" in values and not is_content_addressed(values["filename"]):
+        values["filename"] = static_manifest.fingerprinted(values["filename"])
+
+
+def static_asset(filename):
+    real_name, immutable = filename, is_content_addressed(filename)
+
+    m = _FINGERPRINT_RE.match(filename)
+    if m:
+        candidate = m.group("base") + (m.group("ext") or "")
+        digest = static_manifest.file_hash(candidate)
+        if digest is not None:
+            real_name = candidate
+            # устаревший хэш (файл уже поменялся) — отдаём актуальный, но без вечного кэша
+            immutable = digest == m.group("hash")
+
+    if not immutable:
+        return app.send_static_file(real_name)
+
+    path = safe_join(app.static_folder, real_name)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    mimetype = mimetypes.guess_type(real_name)[0] or "application/octet-stream"
+    encoding = None
+    if os.path.splitext(real_name)[1].lower() in STATIC_COMPRESSIBLE:
+        path, encoding = compressed_variant(path, request.headers.get("Accept-Encoding", ""))
+
+    resp = send_file(path, mimetype=mimetype, conditional=True, max_age=STATIC_IMMUTABLE_MAX_AGE)
+    if encoding:
+        resp.headers["Content-Encoding"] = encoding
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["Cache-Control"] = f"public, max-age={STATIC_IMMUTABLE_MAX_AGE}, immutable"
+    return resp
+
+
+app.view_functions["static"] = static_asset
+
+
+@app.cli.command("assets-build")
+def assets_build_command():
+    """Хэши и .gz/.br копии статики заранее (на этапе сборки)."""
+    failed = static_manifest.build()
+    print(f"static assets: {len(static_manifest._items)} files, {failed} not compressed")
+
+
+# ======================
+# PERF-21: ON-DEMAND IMAGE RESIZE (/img/<w>x<h>/<path>) + LRU DISK CACHE
+# ======================
+# только размеры из списка — иначе любой может забить кэш произвольными WxH; 0 = по пропорции
+IMG_RESIZE_SIZES = {
+    tuple(int(x) for x in size.split("x"))
+    for size in os.getenv("IMG_RESIZE_SIZES", "86x86,172x172,320x0,640x0").split(",") if size.strip()
+}
+IMG_RESIZE_DIRS = ("images/", "uploads/")
+IMG_CACHE_MAX_BYTES = int(os.getenv("IMG_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+
+class ImageResizeCache:
+    """
+    Уменьшенные копии на диске (CACHE_DIR/img). LRU по mtime: попадание «трогает» файл,
+    при переполнении удаляются самые давние до 90% лимита.
+    Один ключ кодирует один поток, остальные ждут его результат.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.root = os.path.abspath(os.path.join(CACHE_DIR, "img"))
+        self._lock = threading.Lock()
+        self._key_lock = KeyedLock()
+        self._size = None  # оценка занятого места, уточняется при вытеснении
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def _path(self, key: str, ext: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.{ext}")
+
+    def get_or_create(self, key: str, ext: str, render) -> str:
+        path = self._path(key, ext)
+        if os.path.exists(path):
+            self._touch(path)
+            self.hits += 1
+            return path
+
+        with self._key_lock(key):
+            if os.path.exists(path):  # пока ждали — сделал другой поток
+                self.hits += 1
+                return path
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+            render(tmp)
+            os.replace(tmp, path)
+            self.misses += 1
+            self._account(os.path.getsize(path), keep=path)
+            return path
+
+    @staticmethod
+    def _touch(path: str):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _scan(self) -> list:
+        files = []
+        for dirpath, _, names in os.walk(self.root):
+            for name in names:
+                full = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                files.append((st.st_mtime_ns, st.st_size, full))
+        return files
+
+    def _account(self, added: int, keep: str):
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._scan())
+            else:
+                self._size += added
+            if self._size <= self.max_bytes:
+                return
+
+            files = sorted(self._scan())
+            total = sum(size for _, size, _ in files)
+            for _, size, full in files:
+                if total <= self.max_bytes * 0.9:
+                    break
+                if full == keep:  # только что созданный — его сейчас отдаём
+                    continue
+                try:
+                    os.remove(full)
+                    total -= size
+                    self.evicted += 1
+                except OSError:
+                    pass
+            self._size = total
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits, "misses": self.misses, "evicted": self.evicted,
+            "bytes": self._size, "max_bytes": self.max_bytes,
+        }
+
 
-    crumbs.reverse()
-    return crumbs
+image_resize_cache = ImageResizeCache(IMG_CACHE_MAX_BYTES)
 
 
-@app.context_processor
-def inject_breadcrumbs():
-    return dict(breadcrumbs=build_breadcrumbs())
+def render_resized(src_path: str, dst_path: str, size: tuple, fmt: str):
+    width, height = size
+    with Image.open(src_path) as im:
+        # JPEG: декодирование сразу в уменьшенном масштабе (1/2, 1/4, 1/8)
+        im.draft("RGB", (width or im.width, height or im.height))
+        im = ImageOps.exif_transpose(im)
+        im = im.convert("RGBA" if fmt != "JPEG" and im.mode in ("RGBA", "LA", "P") else "RGB")
+        if width and height:
+            im = ImageOps.fit(im, (width, height), Image.LANCZOS)
+        else:
+            im.thumbnail((width or im.width, height or im.height), Image.LANCZOS)
 
-@app.context_processor
-def inject_order_statuses():
-    return dict(ORDER_STATUSES=ORDER_STATUSES)
-# ======================
-# SECURITY-35: ADMIN AUDIT LOG
-# ======================
-def audit_admin(action: str, entity: str = None, entity_id: int = None, details: str = None):
-    try:
-        username = getattr(current_user, "username", "unknown")
-        ip = request.headers.get("X-Forwarded-For", request.remote_addr)
-        if ip and "," in ip:
-            ip = ip.split(",")[0].strip()
-        ua = (request.headers.get("User-Agent", "") or "")[:255]
+        options = {"quality": 80, "method": 4} if fmt == "WEBP" else {"quality": 82, "optimize": True}
+        im.save(dst_path, fmt, **options)
 
-        row = AdminAuditLog(
-            admin_username=username,
-            action=action,
-            entity=entity,
-            entity_id=entity_id,
-            ip=ip,
-            user_agent=ua,
-            details=(details or "")[:4000],
-        )
-        db.session.add(row)
-        db.session.commit()
-    except Exception:
-        try:
-            db.session.rollback()
-        except Exception:
-            pass
 
+def img_url(path: str, width: int, height: int = 0) -> str:
+    """url_for для уменьшенной копии; v= — хэш исходника, чтобы URL можно было кэшировать навсегда."""
+    path = path or "images/no-image.png"
+    return url_for("resized_image", size=f"{width}x{height}", filename=path, v=static_manifest.file_hash(path))
 
-# ======================
-# SECURITY: BLOCK EMPTY CHECKOUT
-# ======================
-@app.before_request
-def block_empty_checkout():
-    if request.endpoint == "checkout" and request.method == "POST":
-        cart = session.get("cart", {})
-        if not cart or sum(cart.values()) == 0:
-            return redirect(url_for("cart"))
 
+app.jinja_env.globals.update(img_url=img_url)
 
-# CSRF protect all /admin POST
-@app.before_request
-def csrf_protect_admin():
-    if request.method == "POST" and request.path.startswith("/admin"):
-        form_token = request.form.get("csrf_token")
-        session_token = session.get("csrf_token")
-        if not form_token or not session_token or form_token != session_token:
-            flash("CSRF ошибка. Обновите страницу.", "error")
-            return redirect(url_for("admin_orders"))
 
+@app.route("/img/<size>/<path:filename>")
+def resized_image(size, filename):
+    try:
+        dims = tuple(int(x) for x in size.split("x"))
+    except ValueError:
+        abort(404)
+    if dims not in IMG_RESIZE_SIZES or not filename.startswith(IMG_RESIZE_DIRS):
+        abort(404)
+
+    src_path = safe_join(app.static_folder, filename)
+    if src_path is None or not os.path.isfile(src_path):
+        abort(404)
+
+    st = os.stat(src_path)
+    webp = "image/webp" in request.headers.get("Accept", "")
+    fmt, ext = ("WEBP", "webp") if webp else ("JPEG", "jpg")
+    key = hashlib.sha1(f"{size}|{filename}|{st.st_mtime_ns}|{st.st_size}|{ext}".encode()).hexdigest()
 
-# ======================
-# CORE-19: IMAGE OPTIMIZATION (WEBP)
-# ======================
-def optimize_image_to_webp(src_path: str, dst_path: str, max_size=(1600, 1600), quality: int = 82) -> bool:
     try:
-        with Image.open(src_path) as im:
-            im = im.convert("RGB")
-            im.thumbnail(max_size)
-            os.makedirs(os.path.dirname(dst_path), exist_ok=True)
-            im.save(dst_path, "WEBP", quality=quality, method=6)
-        return True
+        path = image_resize_cache.get_or_create(
+            key, ext, lambda dst: render_resized(src_path, dst, dims, fmt)
+        )
     except Exception:
-        return False
+        # не картинка / битый файл — отдаём исходник как есть
+        logger.warning("resize %s %s failed", size, filename)
+        return redirect(url_for("static", filename=filename))
+
+    versioned = request.args.get("v") == static_manifest.file_hash(filename)
+    resp = send_file(path, mimetype=f"image/{ext if webp else 'jpeg'}", conditional=True)
+    resp.headers["Vary"] = "Accept"
+    resp.headers["Cache-Control"] = (
+        f"public, max-age={STATIC_IMMUTABLE_MAX_AGE}, immutable" if versioned else "public, max-age=3600"
+    )
+    return resp
 
 
 # ======================
@@ -1026,17 +3121,27 @@ def too_many_requests(e):
 
 @app.route("/robots.txt")
 def robots_txt():
+    etag = make_etag("robots", APP_BUILD, request.url_root)
+    cached = not_modified(etag, "public, max-age=3600")
+    if cached:
+        return cached
+
     lines = [
         "User-agent: *",
         "Allow: /",
         "Disallow: /admin",
         "Sitemap: " + request.url_root.rstrip("/") + "/sitemap.xml",
     ]
-    return Response("\n".join(lines), mimetype="text/plain")
+    return with_etag(Response("\n".join(lines), mimetype="text/plain"), etag, "public, max-age=3600")
 
 
 @app.route("/sitemap.xml")
 def sitemap_xml():
+    etag = make_etag("sitemap", APP_BUILD, request.url_root)
+    cached = not_modified(etag, "public, max-age=3600")
+    if cached:
+        return cached
+
     pages = [
         url_for("index", _external=True),
         url_for("catalog", _external=True),
@@ -1053,42 +3158,57 @@ def sitemap_xml():
     for p in pages:
         xml.append(f"<url><loc>{p}</loc></url>")
     xml.append("</urlset>")
-    return Response("\n".join(xml), mimetype="application/xml")
+    return with_etag(Response("\n".join(xml), mimetype="application/xml"), etag, "public, max-age=3600")
 
 
 @app.route("/about")
 def about():
-    return render_template("pages/about.html", lang=session.get("lang", "ru"))
+    return static_page("pages/about.html")
 
 
 @app.route("/policy")
 def policy():
-    return render_template("pages/policy.html", lang=session.get("lang", "ru"))
+    return static_page("pages/policy.html")
 
 
 @app.route("/shipping")
 def shipping():
-    return render_template("pages/shipping.html", lang=session.get("lang", "ru"))
+    return static_page("pages/shipping.html")
 
 
 @app.route("/faq")
 def faq():
-    return render_template("pages/faq.html", lang=session.get("lang", "ru"))
+    return static_page("pages/faq.html")
 
 
 @app.route("/catalog")
 def catalog():
-    products = (
-        Product.query
-        .filter_by(is_active=True)
-        .order_by(Product.id.desc())
-        .all()
+    lang = session.get("lang", "ru")
+
+    # страница = каталог + шапка (гость/пользователь/админ) + счётчик корзины
+    etag = make_etag(
+        "catalog", APP_BUILD, catalog_version.get(), lang, _header_variant(),
+        cart_hash(session.get("cart")), request.url,
     )
-    return render_template(
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    def render_grid():
+        products = (
+            Product.query
+            .filter_by(is_active=True)
+            .order_by(Product.id.desc())
+            .all()
+        )
+        return render_template("partials/catalog_grid.html", products=products, lang=lang)
+
+    html = render_template(
         "catalog.html",
-        products=products,
-        lang=session.get("lang", "ru"),
+        catalog_grid=catalog_cache.get_or_render(lang, render_grid),
+        lang=lang,
     )
+    return with_etag(app.make_response(html), etag)
 
 
 
@@ -1207,24 +3327,50 @@ def add_to_cart(product_id):
 @app.route("/api/cart_count")
 def cart_count():
     cart = session.get("cart", {})
-    return jsonify(cart_total_items=sum(cart.values()))
+    etag = make_etag("cart_count", cart_hash(cart))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    return with_etag(jsonify(cart_total_items=sum(cart.values())), etag)
 
 
-@app.route("/cart")
-def cart():
-    cart = session.get("cart", {})
-    items = []
-    total = 0.0
+# ======================
+# PERF-2: CART PRICING (один IN-запрос на всю корзину)
+# ======================
+def price_cart(cart: dict):
+    """
+    Считает корзину: (lines, total).
+    Все товары грузятся одним запросом WHERE id IN (...);
+    скрытые/удалённые товары и qty <= 0 пропускаются.
+    """
+    qtys = {}
+    for pid, qty in (cart or {}).items():
+        try:
+            pid, qty = int(pid), int(qty)
+        except (TypeError, ValueError):
+            continue
+        if qty > 0:
+            qtys[pid] = qty
 
-    for pid, qty in cart.items():
-        product = Product.query.get(int(pid))
-        if not product or not product.is_active or qty <= 0:
+    if not qtys:
+        return [], 0.0
+
+    products = {
+        p.id: p
+        for p in Product.query.filter(Product.id.in_(list(qtys)), Product.is_active.is_(True)).all()
+    }
+
+    lines = []
+    total = 0.0
+    for pid, qty in qtys.items():
+        product = products.get(pid)
+        if not product:
             continue
 
-        item_total = float(product.price) * int(qty)
+        item_total = float(product.price) * qty
         total += item_total
 
-        items.append(
+        lines.append(
             {
                 "id": product.id,
                 "name": product.name_ru,
@@ -1235,6 +3381,12 @@ def cart():
             }
         )
 
+    return lines, total
+
+
+@app.route("/cart")
+def cart():
+    items, total = price_cart(session.get("cart", {}))
     return render_template("cart.html", items=items, total=total, lang=session.get("lang", "ru"))
 
 
@@ -1257,14 +3409,8 @@ def update_cart(product_id, action):
     session.modified = True
 
     qty = cart.get(pid, 0)
-    product = Product.query.get(product_id)
-    subtotal = float(product.price) * int(qty) if product else 0.0
-
-    total = 0.0
-    for k, v in cart.items():
-        p = Product.query.get(int(k))
-        if p:
-            total += float(p.price) * int(v)
+    lines, total = price_cart(cart)
+    subtotal = next((line["total"] for line in lines if line["id"] == product_id), 0.0)
 
     return jsonify(
         success=True,
@@ -1285,16 +3431,8 @@ def checkout():
     if not cart or sum(cart.values()) == 0:
         return redirect(url_for("cart", lang=session.get("lang", "ru")))
 
-    items = []
-    total = 0.0
-
-    for pid, qty in cart.items():
-        product = Product.query.get(int(pid))
-        if not product or qty <= 0:
-            continue
-        subtotal = float(product.price) * int(qty)
-        total += subtotal
-        items.append(f"{product.name_ru} × {qty}")
+    lines, total = price_cart(cart)
+    items = [f"{line['name']} × {line['qty']}" for line in lines]
 
     items_text = "\n".join(items)
 
@@ -1388,6 +3526,7 @@ def checkout():
             user_id=current_user.id,
             name=name,
             contact=contact,
+            phone_digits=phone_digits(contact),
             address=address,
             delivery_time=delivery_time,
             delivery_provider=delivery_provider,
@@ -1399,16 +3538,24 @@ def checkout():
            )
 
         db.session.add(order)
-        db.session.commit()
-
-        # одноразовый токен — удаляем после успеха
-        session.pop("checkout_token", None)
+        db.session.flush()  # нужен order.id для строк заказа и уведомления
 
-        session["last_order_ts"] = datetime.utcnow().timestamp()
-        session.pop("cart", None)
-        session.modified = True
+        db.session.execute(
+            insert(OrderItem),
+            [
+                {
+                    "order_id": order.id,
+                    "product_id": line["id"],
+                    "name": line["name"],
+                    "unit_price": float(line["price"]),
+                    "qty": line["qty"],
+                }
+                for line in lines
+            ],
+        )
 
-        send_telegram(
+        # уведомление уходит через outbox — в той же транзакции, что и заказ
+        enqueue_telegram(
             "🛒 НОВЫЙ ЗАКАЗ\n"
             f"ID: #{order.id}\n"
             f"Пользователь: {current_user.username}\n"
@@ -1419,7 +3566,16 @@ def checkout():
             f"{items_text}\n"
             f"Итого: {total:.2f} €",
             reply_markup=tg_status_buttons(order.id, order.status),
-     )
+        )
+        db.session.commit()
+        tg_outbox.wake()
+
+        # одноразовый токен — удаляем после успеха
+        session.pop("checkout_token", None)
+
+        session["last_order_ts"] = datetime.utcnow().timestamp()
+        session.pop("cart", None)
+        session.modified = True
 
         return redirect(url_for("profile", lang=session.get("lang", "ru")))
 
@@ -1446,12 +3602,8 @@ def admin_panel():
 @login_required
 @admin_required
 def admin_products():
-    # берём категории из БД (сколько угодно — хоть 100)
-    categories = (
-        Category.query.filter_by(is_active=True)
-        .order_by(Category.sort.asc(), Category.id.asc())
-        .all()
-    )
+    # категории — из кэша (сколько угодно — хоть 100)
+    categories = category_menu_cache.get()
 
     if request.method == "POST":
         name_ru = norm_text(request.form.get("name_ru", ""), max_len=80)
@@ -1491,14 +3643,15 @@ def admin_products():
             flash("Неверный формат файла (только png/jpg/jpeg/webp)", "error")
             return redirect(url_for("admin_products", show=request.args.get("show", "active")))
 
-        os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
-
-        ext = file.filename.rsplit(".", 1)[1].lower()
-        filename = secure_filename(f"{uuid.uuid4().hex}.{ext}")
-        upload_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-        file.save(upload_path)
+        try:
+            image_path = store_upload(file)
+        except UploadRejected as e:
+            db.session.rollback()
+            flash(str(e), "error")
+            return redirect(url_for("admin_products", show=request.args.get("show", "active")))
 
-        image_path = f"uploads/{filename}"
+        # такой же файл уже загружен и полностью обработан — варианты общие
+        same = shared_image_variants(image_path)
 
         product = Product(
             name_ru=name_ru,
@@ -1508,10 +3661,18 @@ def admin_products():
             is_active=True,
             category_id=cat.id,
             legacy_category=category_slug,  # оставим строку как бэкап
+            image_variants=same.image_variants if same else None,
+            image_lqip=same.image_lqip if same else None,
+            image_width=same.image_width if same else None,
+            image_height=same.image_height if same else None,
         )
 
         db.session.add(product)
         db.session.commit()
+        catalog_changed()
+        # webp-варианты — вне запроса; до готовности каталог отдаёт оригинал
+        if not same:
+            submit_background(generate_product_variants, product.id)
 
         flash("Товар добавлен", "success")
         return redirect(url_for("admin_products", show=request.args.get("show", "active")))
@@ -1564,6 +3725,7 @@ def delete_product(id):
     product = Product.query.get_or_404(id)
     product.is_active = False
     db.session.commit()
+    catalog_changed()
     flash("Товар скрыт", "success")
     audit_admin("product_hide", entity="Product", entity_id=product.id, details=product.name_ru)
     return redirect(url_for("admin_products"))
@@ -1576,11 +3738,23 @@ def restore_product(id):
     product = Product.query.get_or_404(id)
     product.is_active = True
     db.session.commit()
+    catalog_changed()
     flash("Товар восстановлен", "success")
     audit_admin("product_restore", entity="Product", entity_id=product.id, details=product.name_ru)
     return redirect(url_for("admin_products"))
 
 
+PRODUCT_IMAGE_DIRS = ("images/", "uploads/")
+
+
+def valid_product_image(path: str) -> bool:
+    """Путь из формы: существующий файл внутри static/images или static/uploads."""
+    if not path or not path.startswith(PRODUCT_IMAGE_DIRS):
+        return False
+    full = safe_join(app.static_folder, path)
+    return full is not None and os.path.isfile(full)
+
+
 @app.route("/admin/products/edit/<int:id>", methods=["GET", "POST"])
 @login_required
 @admin_required
@@ -1597,8 +3771,21 @@ def edit_product(id):
             flash("Некорректная цена", "error")
             return redirect(url_for("edit_product", id=id))
 
-        product.image = request.form.get("image", product.image)
+        new_image = request.form.get("image", product.image).strip()
+        image_changed = new_image != product.image
+        if image_changed and not valid_product_image(new_image):
+            flash("Изображение: укажите файл из images/ или uploads/", "error")
+            return redirect(url_for("edit_product", id=id))
+        if image_changed:
+            release_upload(product.image)
+            retain_upload(new_image)
+            product.image = new_image
+            product.image_variants = product.image_lqip = None
+            product.image_width = product.image_height = None
         db.session.commit()
+        catalog_changed()
+        if image_changed and new_image:
+            submit_background(generate_product_variants, product.id)
 
         flash("Товар обновлён", "success")
         audit_admin("product_edit", entity="Product", entity_id=product.id, details=product.name_ru)
@@ -1607,14 +3794,245 @@ def edit_product(id):
     return render_template("admin/edit_product.html", product=product, lang=session.get("lang", "ru"))
 
 
+# ======================
+# PERF-9: ORDER SEARCH (name / contact / phone digits)
+# ======================
+ORDER_SEARCH_INDEX_MAX_DOCS = int(os.getenv("ORDER_SEARCH_INDEX_MAX_DOCS", "200000"))
+
+# правка имени/контакта или удаление заказа в любом воркере -> индексы всех воркеров перестраиваются
+order_search_version = VersionStamp("order_search")
+
+
+class OrderSearchIndex:
+    """
+    Триграммный индекс в памяти процесса — замена pg_trgm для SQLite.
+    Строится в фоне; пока он не готов (или перестраивается после смены order_search_version),
+    поиск идёт обычным LIKE. Новые заказы догружаются по id > max_id перед каждым поиском.
+    Больше max_docs заказов индекс не держит — тоже LIKE.
+    """
+
+    MAX_CANDIDATES = 5000
+
+    def __init__(self, max_docs: int = ORDER_SEARCH_INDEX_MAX_DOCS):
+        self.max_docs = max_docs
+        self._lock = threading.Lock()
+        self._version = None  # для какой версии построен индекс (или решено, что он слишком большой)
+        self._docs = None  # order_id -> (name, contact, digits) в нижнем регистре
+        self._postings = None  # trigram -> {order_id}
+        self._max_id = 0
+        self._building = False
+        self.too_big = False
+
+    @staticmethod
+    def _trigrams(s: str):
+        return {s[i:i + 3] for i in range(len(s) - 2)}
+
+    def _load(self, docs: dict, postings, after_id: int):
+        """Добавляет заказы с id > after_id. Новый max_id или None, если индекс перерос max_docs."""
+        rows = (
+            db.session.query(Order.id, Order.name, Order.contact, Order.phone_digits)
+            .filter(Order.id > after_id)
+            .order_by(Order.id.asc())
+            .limit(self.max_docs - len(docs) + 1)
+            .all()
+        )
+        if len(docs) + len(rows) > self.max_docs:
+            return None
+        for order_id, name, contact, digits in rows:
+            doc = ((name or "").lower(), (contact or "").lower(), digits or "")
+            docs[order_id] = doc
+            for field in doc:
+                for tri in self._trigrams(field):
+                    postings[tri].add(order_id)
+            after_id = order_id
+        return after_id
+
+    def build(self, version: int = None):
+        """Полная сборка вне лока; готовый индекс подменяется целиком."""
+        version = order_search_version.get() if version is None else version
+        try:
+            with app.app_context():
+                docs, postings = {}, defaultdict(set)
+                max_id = self._load(docs, postings, 0)
+                db.session.remove()
+            with self._lock:
+                self._version = version
+                self.too_big = max_id is None
+                if self.too_big:
+                    self._docs = self._postings = None
+                    logger.warning("order search index: more than %s orders, using LIKE", self.max_docs)
+                else:
+                    self._docs, self._postings, self._max_id = docs, postings, max_id
+        except Exception:
+            logger.exception("order search index build failed")
+        finally:
+            with self._lock:
+                self._building = False
+
+    def search(self, q: str):
+        """Список id заказов, где q встречается как подстрока; None — если индекс не поможет."""
+        needles = {q.lower()}
+        digits = phone_digits(q)
+        if len(digits) >= 3 and re.fullmatch(r"[\d\s()+\-]+", q):
+            needles.add(digits)
+        if any(len(n) < 3 for n in needles):
+            return None
+
+        version = order_search_version.get()
+        with self._lock:
+            if self._version != version:
+                if not self._building:
+                    self._building = True
+                    submit_background(self.build, version)
+                return None
+            if self.too_big:
+                return None
+
+            max_id = self._load(self._docs, self._postings, self._max_id)
+            if max_id is None:
+                self.too_big = True
+                self._docs = self._postings = None
+                return None
+            self._max_id = max_id
+
+            found = set()
+            for needle in needles:
+                grams = sorted(self._trigrams(needle), key=lambda g: len(self._postings.get(g, ())))
+                cands = set(self._postings.get(grams[0], ()))
+                for g in grams[1:]:
+                    if not cands:
+                        break
+                    cands &= self._postings.get(g, set())
+                found |= {i for i in cands if any(needle in field for field in self._docs.get(i, ()))}
+
+        if len(found) > self.MAX_CANDIDATES:
+            return None
+        return list(found)
+
+
+order_search_index = OrderSearchIndex()
+
+
+def order_search_changed():
+    try:
+        order_search_version.bump()
+    except OSError:
+        logger.exception("order search version bump failed")
+
+
+@event.listens_for(Order, "after_update")
+def _order_search_fields_updated(mapper, connection, target):
+    state = sa_inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in ("name", "contact", "phone_digits")):
+        order_search_changed()
+
+
+@event.listens_for(Order, "after_delete")
+def _order_search_row_deleted(mapper, connection, target):
+    order_search_changed()
+
+
+def order_search_filter(q: str):
+    """
+    Условие поиска заказов: ID, имя, контакт или часть телефона.
+    Postgres — ILIKE по триграммным GIN-индексам, SQLite — OrderSearchIndex.
+    """
+    digits = phone_digits(q)
+    is_phone = len(digits) >= 3 and re.fullmatch(r"[\d\s()+\-]+", q)
+
+    by_id = [Order.id == int(q)] if q.isdigit() else []
+
+    if db.engine.dialect.name != "postgresql":
+        ids = order_search_index.search(q)
+        if ids is not None:
+            # id подставляются в SQL литералами: до 5000 штук, лимит SQLite на переменные (999) не мешает
+            return or_(*by_id, Order.id.in_(bindparam("order_search_ids", ids, expanding=True, literal_execute=True)))
+
+    like = f"%{q}%"
+    conds = by_id + [Order.name.ilike(like), Order.contact.ilike(like)]
+    if is_phone:
+        conds.append(Order.phone_digits.like(f"%{digits}%"))
+    return or_(*conds)
+
+
+# ======================
+# PERF-7: KEYSET PAGINATION (orders)
+# ======================
+ORDERS_PER_PAGE = 20
+ORDERS_COUNT_TTL_SEC = 60
+ORDERS_COUNT_CACHE_SIZE = 256
+
+_orders_count_cache = OrderedDict()  # (show, q) -> (expires_at, count), LRU
+_orders_count_lock = threading.Lock()
+
+
+def encode_order_cursor(order) -> str:
+    raw = f"{order.created_at.isoformat()}|{order.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_order_cursor(token: str):
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        created_at, order_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), int(order_id)
+    except Exception:
+        return None
+
+
+def keyset_orders_page(query, after=None, before=None, limit: int = ORDERS_PER_PAGE):
+    """
+    Страница заказов по ключу (created_at, id) DESC вместо OFFSET.
+    Возвращает (orders, next_cursor, prev_cursor).
+    """
+    key = tuple_(Order.created_at, Order.id)
+
+    if before:
+        rows = query.filter(key > before).order_by(Order.created_at.asc(), Order.id.asc()).limit(limit + 1).all()
+        has_more_newer = len(rows) > limit
+        rows = list(reversed(rows[:limit]))
+        has_more_older = True
+    else:
+        if after:
+            query = query.filter(key < after)
+        rows = query.order_by(Order.created_at.desc(), Order.id.desc()).limit(limit + 1).all()
+        has_more_older = len(rows) > limit
+        rows = rows[:limit]
+        has_more_newer = after is not None
+
+    next_cursor = encode_order_cursor(rows[-1]) if rows and has_more_older else None
+    prev_cursor = encode_order_cursor(rows[0]) if rows and has_more_newer else None
+    return rows, next_cursor, prev_cursor
+
+
+def cached_orders_count(query, show: str, q: str) -> int:
+    now = time.monotonic()
+    key = (show, q)
+    with _orders_count_lock:
+        hit = _orders_count_cache.get(key)
+        if hit and hit[0] > now:
+            _orders_count_cache.move_to_end(key)
+            return hit[1]
+
+    count = query.order_by(None).count()
+    with _orders_count_lock:
+        _orders_count_cache[key] = (now + ORDERS_COUNT_TTL_SEC, count)
+        _orders_count_cache.move_to_end(key)
+        while len(_orders_count_cache) > ORDERS_COUNT_CACHE_SIZE:
+            _orders_count_cache.popitem(last=False)
+    return count
+
+
 @app.route("/admin/orders")
 @admin_required
 @login_required
 def admin_orders():
     show = request.args.get("show", "active")
     q = request.args.get("q", "").strip()
-    page = request.args.get("page", 1, type=int)
-    PER_PAGE = 20
+    after = decode_order_cursor(request.args.get("after", ""))
+    before = decode_order_cursor(request.args.get("before", ""))
 
     # ✅ что считаем архивом
     ARCHIVE_STATUSES = ("completed", "canceled")
@@ -1636,20 +4054,22 @@ def admin_orders():
         )
 
     if q:
-        if q.isdigit():
-            query = query.filter(Order.id == int(q))
-        else:
-            like = f"%{q}%"
-            query = query.filter(or_(Order.name.ilike(like), Order.contact.ilike(like)))
+        query = query.filter(order_search_filter(q))
 
-    pagination = query.order_by(Order.created_at.desc()).paginate(
-        page=page, per_page=PER_PAGE, error_out=False
+    # точное число заказов — только по запросу (?count=1) и с кэшем на минуту
+    total = cached_orders_count(query, show, q) if request.args.get("count") else None
+
+    # история статусов — одним запросом на всю страницу (в шаблоне цикл по order.status_history)
+    orders, next_cursor, prev_cursor = keyset_orders_page(
+        query.options(selectinload(Order.status_history)), after=after, before=before
     )
 
     return render_template(
         "admin/orders.html",
-        orders=pagination.items,
-        pagination=pagination,
+        orders=orders,
+        next_cursor=next_cursor,
+        prev_cursor=prev_cursor,
+        total=total,
         ORDER_STATUSES=ORDER_STATUSES,
         ALLOWED_STATUS_TRANSITIONS=ALLOWED_STATUS_TRANSITIONS,
         lang=session.get("lang", "ru"),
@@ -1735,6 +4155,7 @@ def hard_delete_order(order_id):
 
     OrderStatusHistory.query.filter_by(order_id=order.id).delete()
     OrderComment.query.filter_by(order_id=order.id).delete()
+    OrderItem.query.filter_by(order_id=order.id).delete()
 
     db.session.delete(order)
     db.session.commit()
@@ -1794,19 +4215,45 @@ def export_orders_csv():
         query = query.filter(Order.is_deleted.is_(False), Order.status.in_(ACTIVE_STATUSES))
 
     if q:
-        if q.isdigit():
-            query = query.filter(Order.id == int(q))
-        else:
-            like = f"%{q}%"
-            query = query.filter(or_(Order.name.ilike(like), Order.contact.ilike(like)))
+        query = query.filter(order_search_filter(q))
+
+    rows = (
+        query.with_entities(
+            Order.id, Order.name, Order.contact, Order.items, Order.total, Order.status, Order.created_at
+        )
+        .order_by(Order.created_at.desc(), Order.id.desc())
+        .yield_per(1000)  # Postgres: server-side cursor, в памяти не больше 1000 строк
+    )
+
+    use_gzip = request.args.get("gzip", "1") != "0" and "gzip" in request.headers.get("Accept-Encoding", "")
+
+    audit_admin("orders_export_csv", entity="Order", details=f"show={show} q={q}")
+    return Response(
+        stream_with_context(_stream_orders_csv(rows, use_gzip)),
+        mimetype="text/csv",
+        headers={
+            "Content-Disposition": f"attachment; filename=orders_{show}.csv",
+            "Vary": "Accept-Encoding",
+            **({"Content-Encoding": "gzip"} if use_gzip else {}),
+        },
+    )
+
 
-    orders = query.order_by(Order.created_at.desc()).all()
+def _stream_orders_csv(rows, use_gzip: bool, flush_every: int = 500):
+    """Генератор CSV: отдаёт куски по flush_every строк, память не растёт с числом заказов."""
+    buf = StringIO()
+    writer = csv.writer(buf)
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31) if use_gzip else None  # 31 = gzip-обёртка
+
+    def take():
+        data = buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+        return gz.compress(data) if gz else data
 
-    si = StringIO()
-    writer = csv.writer(si)
     writer.writerow(["ID", "Имя", "Контакт", "Состав", "Сумма", "Статус", "Дата"])
 
-    for o in orders:
+    for n, o in enumerate(rows, 1):
         writer.writerow(
             [
                 o.id,
@@ -1818,15 +4265,108 @@ def export_orders_csv():
                 o.created_at.strftime("%d.%m.%Y %H:%M"),
             ]
         )
+        if n % flush_every == 0:
+            chunk = take()
+            if chunk:
+                yield chunk
 
-    output = si.getvalue()
-    si.close()
+    chunk = take()
+    if gz:
+        chunk += gz.flush()
+    if chunk:
+        yield chunk
 
-    audit_admin("orders_export_csv", entity="Order", details=f"show={show} q={q}")
-    return Response(
-        output,
-        mimetype="text/csv",
-        headers={"Content-Disposition": f"attachment; filename=orders_{show}.csv"},
+
+# ======================
+# PERF-10: ORDER ITEMS — BACKFILL + SALES REPORT
+# ======================
+ORDER_ITEM_LINE_RE = re.compile(r"^(.*\S)\s*×\s*(\d+)\s*$")
+
+
+def parse_order_items_text(items_text: str):
+    """'Название × 2' построчно -> [(name, qty)]; нераспознанные строки пропускаются."""
+    out = []
+    for line in (items_text or "").splitlines():
+        match = ORDER_ITEM_LINE_RE.match(line.strip())
+        if match:
+            out.append((match.group(1), int(match.group(2))))
+    return out
+
+
+def backfill_order_items(chunk_size: int = 500) -> int:
+    """
+    Заполняет order_item для старых заказов из текстового Order.items, пачками по id.
+    Цена: текущая цена товара с тем же name_ru, иначе total/qty для заказа из одной строки.
+    """
+    products = {name: (pid, price) for pid, name, price in db.session.query(Product.id, Product.name_ru, Product.price)}
+    has_items = db.session.query(OrderItem.id).filter(OrderItem.order_id == Order.id).exists()
+
+    done = 0
+    last_id = 0
+    while True:
+        orders = (
+            db.session.query(Order.id, Order.items, Order.total)
+            .filter(Order.id > last_id, ~has_items)
+            .order_by(Order.id.asc())
+            .limit(chunk_size)
+            .all()
+        )
+        if not orders:
+            return done
+
+        rows = []
+        for order_id, items_text, total in orders:
+            parsed = parse_order_items_text(items_text)
+            for name, qty in parsed:
+                product_id, price = products.get(name, (None, None))
+                if price is None and len(parsed) == 1 and qty:
+                    price = float(total or 0) / qty
+                rows.append({"order_id": order_id, "product_id": product_id, "name": name[:200], "unit_price": price, "qty": qty})
+
+        if rows:
+            db.session.execute(insert(OrderItem), rows)
+        db.session.commit()
+
+        done += len(orders)
+        last_id = orders[-1][0]
+
+
+@app.cli.command("backfill-order-items")
+def backfill_order_items_command():
+    n = backfill_order_items()
+    print(f"order_item backfill: {n} orders")
+
+
+def product_sales(since: datetime = None):
+    """Продажи по товарам: агрегат по order_item (индекс product_id, order_id)."""
+    query = (
+        db.session.query(
+            OrderItem.product_id,
+            OrderItem.name,
+            func.sum(OrderItem.qty).label("qty"),
+            func.sum(OrderItem.qty * OrderItem.unit_price).label("revenue"),
+        )
+        .join(Order, Order.id == OrderItem.order_id)
+        .filter(Order.status != "canceled")
+    )
+    if since:
+        query = query.filter(Order.created_at >= since)
+    return query.group_by(OrderItem.product_id, OrderItem.name).order_by(func.sum(OrderItem.qty).desc()).all()
+
+
+@app.route("/admin/reports/sales")
+@admin_required
+@login_required
+def admin_sales_report():
+    days = request.args.get("days", type=int)
+    since = datetime.utcnow() - timedelta(days=days) if days else None
+    rows = product_sales(since)
+    return jsonify(
+        ok=True,
+        items=[
+            {"product_id": r.product_id, "name": r.name, "qty": int(r.qty or 0), "revenue": round(float(r.revenue or 0), 2)}
+            for r in rows
+        ],
     )
 
 
@@ -1873,6 +4413,23 @@ def links_check():
     }
     return jsonify(ok=True, links=links)
 
+
+# ======================
+# PERF-1: CACHE STATS (admin)
+# ======================
+@app.route("/admin/metrics")
+@admin_required
+@login_required
+def admin_metrics():
+    return jsonify(
+        ok=True,
+        catalog_cache=catalog_cache.stats(),
+        static_pages=static_page_cache.stats(),
+        telegram=tg_client.stats(),
+        image_resize=image_resize_cache.stats(),
+        db_routes={k: dict(v, db_ms=round(v["db_ms"], 1)) for k, v in _route_query_stats.items()},
+    )
+
 @app.route("/admin/product/<int:id>/hard_delete", methods=["POST"])
 @login_required
 @admin_required
@@ -1884,34 +4441,26 @@ def hard_delete_product(id):
         flash("Сначала скройте товар, потом удаляйте навсегда", "error")
         return redirect(url_for("admin_products", show=request.args.get("show", "active")))
 
-    # --- (опционально) удалить файл изображения ---
-    try:
-        if p.image and p.image.startswith("uploads/"):
-            abs_path = os.path.join(app.static_folder, p.image)  # static/uploads/...
-            if os.path.exists(abs_path):
-                os.remove(abs_path)
-    except Exception:
-        pass
+    # файл общий для одинаковых загрузок: только refcount-1, удалит периодическая чистка
+    release_upload(p.image)
 
     db.session.delete(p)
     db.session.commit()
+    catalog_changed()
     flash("Товар удалён навсегда", "success")
     return redirect(url_for("admin_products", show=request.args.get("show", "inactive")))
 
 @app.route("/privacy")
 def privacy():
-    lang = request.args.get("lang", session.get("lang", "ru"))
-    return render_template("privacy.html", lang=lang, t=t)
+    return static_page("privacy.html")
 
 @app.route("/terms")
 def terms():
-    lang = request.args.get("lang", session.get("lang", "ru"))
-    return render_template("terms.html", lang=lang, t=t)
+    return static_page("terms.html")
 
 @app.route("/contacts")
 def contacts():
-    lang = request.args.get("lang", session.get("lang", "ru"))
-    return render_template("contacts.html", lang=lang, t=t)
+    return static_page("contacts.html")
 
 @app.post("/admin/orders/<int:order_id>/courier")
 @login_required
@@ -1927,6 +4476,60 @@ def update_order_courier(order_id):
 
     return redirect(url_for("admin_orders", show=request.args.get("show", "active"), lang=session.get("lang","ru")))
 
+# ======================
+# PERF-5: TG WEBHOOK — DEDUPE + BACKGROUND
+# ======================
+TG_UPDATE_DEDUPE_TTL_SEC = 24 * 3600
+
+
+class BackgroundPool:
+    """Пул потоков на процесс (после fork создаётся заново); задачи выполняются внутри app context."""
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get(self) -> ThreadPoolExecutor:
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+                    self._pid = os.getpid()
+        return self._executor
+
+    def submit(self, fn, *args, **kwargs):
+        def run():
+            with app.app_context():
+                try:
+                    fn(*args, **kwargs)
+                except Exception:
+                    logger.exception("background task %s failed", getattr(fn, "__name__", fn))
+                    try:
+                        db.session.rollback()
+                    except Exception:
+                        pass
+
+        return self._get().submit(run)
+
+    def shutdown(self, wait: bool = True):
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+# картинки/чистка не должны задерживать ответы в Telegram — у вебхука свой пул
+bg_pool = BackgroundPool("wallcraft-bg", int(os.getenv("BG_WORKERS", "4")))
+tg_pool = BackgroundPool("wallcraft-tg", int(os.getenv("TG_WEBHOOK_WORKERS", "2")))
+
+
+def submit_background(fn, *args, **kwargs):
+    """Выполнить fn в общем фоновом пуле (внутри app context)."""
+    return bg_pool.submit(fn, *args, **kwargs)
+
+
 @app.route("/tg/webhook", methods=["POST"])
 def tg_webhook():
     secret = os.getenv("TG_WEBHOOK_SECRET", "")
@@ -1942,6 +4545,20 @@ def tg_webhook():
     if not cb:
         return "ok", 200
 
+    # Telegram повторяет медленные вебхуки, повтор может прийти в другой воркер —
+    # дубли по update_id / callback id отсекаем через общее хранилище (rl_store)
+    update_id = data.get("update_id")
+    if update_id is not None and not rl_store.add(f"tg:u:{update_id}", TG_UPDATE_DEDUPE_TTL_SEC):
+        return "ok", 200
+    if cb.get("id") and not rl_store.add(f"tg:cb:{cb.get('id')}", TG_UPDATE_DEDUPE_TTL_SEC):
+        return "ok", 200
+
+    # отвечаем сразу, переход статуса и оба вызова Telegram — в фоне
+    tg_pool.submit(_tg_process_callback, cb)
+    return "ok", 200
+
+
+def _tg_process_callback(cb: dict):
     cb_id = cb.get("id")
     msg = cb.get("message") or {}
     chat_id = (msg.get("chat") or {}).get("id")
@@ -1953,7 +4570,7 @@ def tg_webhook():
         parts = payload.split(":")
         if len(parts) != 4 or parts[0] != "order" or parts[2] != "status":
             _tg_answer(cb_id, "Неверная команда")
-            return "ok", 200
+            return
 
         order_id = int(parts[1])
         new_status = parts[3].strip()
@@ -1961,7 +4578,7 @@ def tg_webhook():
         order = Order.query.get(order_id)
         if not order:
             _tg_answer(cb_id, "Заказ не найден")
-            return "ok", 200
+            return
 
         old_status = normalize_order_status(order.status)
         new_status = normalize_order_status(new_status)
@@ -1969,7 +4586,7 @@ def tg_webhook():
         allowed = TG_ALLOWED_NEXT.get(old_status, [])
         if new_status not in allowed:
             _tg_answer(cb_id, "Нельзя прыгать через статусы")
-            return "ok", 200
+            return
 
         order.status = new_status
         order.is_deleted = new_status in ("completed", "canceled")
@@ -1982,13 +4599,12 @@ def tg_webhook():
         ))
         db.session.commit()
 
-        # обновим кнопки
+        # сначала ответ на callback (убирает "часики" у кнопки), потом кнопки
+        _tg_answer(cb_id, f"✅ Статус: {ORDER_STATUSES[new_status]['ru']}")
+
         if chat_id and message_id:
             _tg_edit_buttons(chat_id, message_id, tg_status_buttons(order.id, order.status))
 
-        _tg_answer(cb_id, f"✅ Статус: {ORDER_STATUSES[new_status]['ru']}")
-        return "ok", 200
-
     except Exception:
         logger.exception("tg_webhook error")
         try:
@@ -1997,35 +4613,58 @@ def tg_webhook():
             pass
         if cb_id:
             _tg_answer(cb_id, "Ошибка")
-        return "ok", 200
 
 
 def _tg_answer(callback_query_id: str, text: str):
-    token = os.getenv("TG_BOT_TOKEN")
-    if not token or not callback_query_id:
+    if not os.getenv("TG_BOT_TOKEN") or not callback_query_id:
         return
     try:
-        requests.post(
-            f"https://api.telegram.org/bot{token}/answerCallbackQuery",
-            json={"callback_query_id": callback_query_id, "text": text, "show_alert": False},
-            timeout=10,
+        tg_client.call(
+            "answerCallbackQuery",
+            {"callback_query_id": callback_query_id, "text": text, "show_alert": False},
+            timeout=(3.05, 5),
         )
     except Exception:
         pass
 
 
 def _tg_edit_buttons(chat_id: int, message_id: int, reply_markup: dict | None):
-    token = os.getenv("TG_BOT_TOKEN")
-    if not token or not chat_id or not message_id:
+    if not os.getenv("TG_BOT_TOKEN") or not chat_id or not message_id:
         return
     try:
-        requests.post(
-            f"https://api.telegram.org/bot{token}/editMessageReplyMarkup",
-            json={"chat_id": chat_id, "message_id": message_id, "reply_markup": reply_markup},
-            timeout=10,
+        tg_client.call(
+            "editMessageReplyMarkup",
+            {"chat_id": chat_id, "message_id": message_id, "reply_markup": reply_markup},
+            timeout=(3.05, 5),
         )
     except Exception:
         pass
 
+# ======================
+# BOOT: проверка версии схемы (PERF-11), хлебные крошки (PERF-14)
+# ======================
+precompute_breadcrumbs()
+
+with app.app_context():
+    _boot_version = current_schema_version()
+    if _boot_version < SCHEMA_VERSION:
+        if AUTO_MIGRATE:
+            migrate_schema()
+        elif os.environ.get("FLASK_RUN_FROM_CLI") == "true":
+            # flask-команды (db-upgrade и др.) должны подниматься и на старой схеме
+            logger.warning(
+                "DB schema version %s < %s: run `flask --app app db-upgrade`", _boot_version, SCHEMA_VERSION
+            )
+        else:
+            # воркер на старой схеме упадёт на первом же запросе к новым колонкам — не стартуем
+            raise RuntimeError(
+                f"DB schema version {_boot_version} < {SCHEMA_VERSION}: "
+                "run `flask --app app db-upgrade` or set AUTO_MIGRATE=1"
+            )
+    db.session.remove()
+
+if STATIC_PRECOMPRESS_ON_START:
+    submit_background(static_manifest.precompress)
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=int(os.getenv("PORT", "8080")))
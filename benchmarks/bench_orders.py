@@ -0,0 +1,168 @@
+"""
+Бенчмарк списка заказов: выгрузка CSV (пиковый RSS) и keyset vs OFFSET.
+
+    python benchmarks/bench_orders.py --orders 1000000
+
+База — временный SQLite (или BENCH_DATABASE_URL). Каждый режим выгрузки
+запускается в отдельном процессе, чтобы ru_maxrss не смешивался.
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, or_
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_env(db_url: str):
+    os.environ["DATABASE_URL"] = db_url
+    os.environ.setdefault("AUTO_MIGRATE", "1")
+    os.environ.setdefault("TG_OUTBOX_WORKER", "off")
+    os.environ.setdefault("RATELIMIT_STORAGE", "memory")
+    os.environ.setdefault("UPLOAD_SWEEP_INTERVAL_SEC", "0")
+    os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="wallcraft-bench-cache-"))
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+
+
+def seed(wc, n: int):
+    from werkzeug.security import generate_password_hash
+
+    with wc.app.app_context():
+        db = wc.db
+        if not wc.User.query.filter_by(username="bench-admin").first():
+            db.session.add(wc.User(username="bench-admin", password=generate_password_hash("pw"), role="admin"))
+            db.session.commit()
+        have = db.session.query(func.count(wc.Order.id)).scalar()
+        start = datetime(2024, 1, 1)
+        batch = []
+        for i in range(have, n):
+            batch.append(dict(
+                user_id=1, name=f"Client {i}", contact=f"+371 2{i % 10000000:07d}", phone_digits="",
+                items="Дверь × 1\nОбои × 3", total=120.5, status="completed", is_deleted=i % 10 == 0,
+                created_at=start + timedelta(seconds=i),
+            ))
+            if len(batch) == 50000:
+                db.session.execute(wc.Order.__table__.insert(), batch)
+                db.session.commit()
+                batch = []
+        if batch:
+            db.session.execute(wc.Order.__table__.insert(), batch)
+            db.session.commit()
+
+
+def archive_query(wc):
+    # тот же фильтр, что у /admin/orders?show=archive
+    Order = wc.Order
+    return Order.query.filter(or_(Order.is_deleted.is_(True), Order.status.in_(("completed", "canceled"))))
+
+
+def rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def export_stream(wc):
+    client = wc.app.test_client()
+    client.post("/login", data={"username": "bench-admin", "password": "pw"})
+    before = rss_mb()
+    started = time.perf_counter()
+    resp = client.get("/admin/orders/export?show=archive", headers={"Accept-Encoding": "gzip"}, buffered=False)
+    first_byte = None
+    size = 0
+    for chunk in resp.response:
+        if first_byte is None:
+            first_byte = time.perf_counter() - started
+        size += len(chunk)
+    return dict(
+        mode="stream", seconds=time.perf_counter() - started, first_byte=first_byte,
+        bytes=size, rss_growth_mb=rss_mb() - before,
+    )
+
+
+def export_all(wc):
+    # как было до стриминга: .all() + весь CSV в StringIO
+    import csv
+    from io import StringIO
+
+    with wc.app.app_context():
+        before = rss_mb()
+        started = time.perf_counter()
+        orders = archive_query(wc).order_by(wc.Order.created_at.desc()).all()
+        buf = StringIO()
+        writer = csv.writer(buf)
+        for o in orders:
+            writer.writerow([o.id, o.name, o.contact, o.items, o.total, o.status, o.created_at])
+        data = buf.getvalue().encode("utf-8")
+        return dict(
+            mode="all", seconds=time.perf_counter() - started, first_byte=time.perf_counter() - started,
+            bytes=len(data), rss_growth_mb=rss_mb() - before,
+        )
+
+
+def paging(wc, n: int, repeat: int = 5):
+    Order = wc.Order
+    with wc.app.app_context():
+        base = archive_query(wc)
+        ordered = base.order_by(Order.created_at.desc(), Order.id.desc())
+        results = []
+        for depth in (0, n // 2, max(n - 40, 0)):
+            t = time.perf_counter()
+            for _ in range(repeat):
+                page = ordered.offset(depth).limit(wc.ORDERS_PER_PAGE + 1).all()
+            offset_ms = (time.perf_counter() - t) / repeat * 1000
+
+            # курсор = последняя строка предыдущей страницы
+            cursor = None
+            if depth:
+                prev = ordered.offset(depth - 1).limit(1).one()
+                cursor = (prev.created_at, prev.id)
+            t = time.perf_counter()
+            for _ in range(repeat):
+                keyset, _, _ = wc.keyset_orders_page(base, after=cursor)
+            keyset_ms = (time.perf_counter() - t) / repeat * 1000
+
+            assert [o.id for o in keyset] == [o.id for o in page[:wc.ORDERS_PER_PAGE]]
+            results.append((depth, offset_ms, keyset_ms))
+            wc.db.session.remove()
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--db", default=os.getenv("BENCH_DATABASE_URL"))
+    parser.add_argument("--mode", choices=["stream", "all"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    db_url = args.db or f"sqlite:///{os.path.join(tempfile.gettempdir(), 'wallcraft-bench-orders.db')}"
+    setup_env(db_url)
+    import app as wc
+
+    if args.mode:
+        res = (export_stream if args.mode == "stream" else export_all)(wc)
+        print(
+            f"export {res['mode']:6}: {res['seconds']:6.1f} s, first byte {res['first_byte']:.3f} s, "
+            f"{res['bytes'] / 1e6:7.1f} MB, peak RSS growth {res['rss_growth_mb']:7.1f} MB"
+        )
+        return
+
+    t = time.perf_counter()
+    seed(wc, args.orders)
+    print(f"orders: {args.orders} (seed {time.perf_counter() - t:.1f} s, {db_url})")
+
+    for mode in ("stream", "all"):
+        subprocess.run([sys.executable, __file__, "--orders", str(args.orders), "--db", db_url, "--mode", mode],
+                       check=True)
+
+    for depth, offset_ms, keyset_ms in paging(wc, args.orders):
+        print(f"page at row {depth:>8}: OFFSET {offset_ms:8.2f} ms   keyset {keyset_ms:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
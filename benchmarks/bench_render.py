@@ -0,0 +1,121 @@
+"""
+Бенчмарк рендера: контекст-процессоры на один рендер, поиск перевода t()
+и время типовых страниц.
+
+    python benchmarks/bench_render.py
+    python benchmarks/bench_render.py --root /path/to/older/checkout   # сравнить с другой версией
+
+База — временный SQLite с несколькими товарами.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ("/", "/catalog", "/faq", "/cart", "/contacts")
+
+
+def setup_env(root: str):
+    tmp = tempfile.mkdtemp(prefix="wallcraft-bench-render-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ.setdefault("AUTO_MIGRATE", "1")
+    os.environ.setdefault("TG_OUTBOX_WORKER", "off")
+    os.environ.setdefault("RATELIMIT_STORAGE", "memory")
+    os.environ.setdefault("UPLOAD_SWEEP_INTERVAL_SEC", "0")
+    os.environ.setdefault("CACHE_DIR", os.path.join(tmp, "cache"))
+    sys.path.insert(0, root)
+    os.chdir(root)
+
+
+def seed(wc, n: int = 20):
+    with wc.app.app_context():
+        wc.db.create_all()
+        for i in range(n):
+            wc.db.session.add(wc.Product(name_ru=f"Товар {i}", name_lv=f"Prece {i}", price=10 + i))
+        wc.db.session.commit()
+
+
+def old_t(wc):
+    # поиск перевода как до PERF-14: TRANSLATIONS[key][lang] с цепочкой fallback
+    translations, langs = wc.TRANSLATIONS, wc.SUPPORTED_LANGS
+
+    def t(key, lang):
+        lang = lang.lower()
+        if lang not in langs:
+            lang = "ru"
+        pack = translations.get(key)
+        if not pack:
+            return key
+        return pack.get(lang) or pack.get("ru") or pack.get("lv") or pack.get("en") or key
+
+    return t
+
+
+def bench_translations(wc, rounds: int):
+    keys = list(wc.TRANSLATIONS)
+    total = rounds * len(keys)
+
+    lookup = old_t(wc)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for key in keys:
+            lookup(key, "lv")
+    print(f"t() old   : {(time.perf_counter() - started) / total * 1e9:7.0f} ns/lookup")
+
+    translate = getattr(wc, "TRANSLATORS", {}).get("lv")
+    if translate:
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for key in keys:
+                translate(key)
+        print(f"t() bound : {(time.perf_counter() - started) / total * 1e9:7.0f} ns/lookup")
+
+
+def bench_context(wc, renders: int):
+    procs = wc.app.template_context_processors[None]
+    client = wc.app.test_client()
+    client.get("/faq")
+    with wc.app.test_request_context("/faq"):
+        wc.app.preprocess_request()
+        started = time.perf_counter()
+        for _ in range(renders):
+            ctx = {}
+            for fn in procs:
+                ctx.update(fn())
+        per_render = (time.perf_counter() - started) / renders * 1e6
+    print(f"context   : {per_render:7.1f} µs/render ({len(procs)} processors)")
+
+
+def bench_pages(wc, requests: int):
+    client = wc.app.test_client()
+    client.post("/api/add_to_cart/1")
+    for url in PAGES:
+        client.get(url)
+        started = time.perf_counter()
+        for _ in range(requests):
+            resp = client.get(url)
+        elapsed = (time.perf_counter() - started) / requests * 1000
+        print(f"GET {url:10}: {elapsed:6.2f} ms/req (HTTP {resp.status_code})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", default=ROOT, help="каталог с app.py")
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--renders", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    setup_env(os.path.abspath(args.root))
+    import app as wc
+
+    seed(wc)
+    bench_translations(wc, args.rounds)
+    bench_context(wc, args.renders)
+    bench_pages(wc, args.requests)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TMP = tempfile.mkdtemp(prefix="wallcraft-tests-")
+
+# app.py читает окружение при импорте
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{TMP}/test.db")
+os.environ["AUTO_MIGRATE"] = "1"
+os.environ["TG_OUTBOX_WORKER"] = "off"
+os.environ["RATELIMIT_STORAGE"] = "memory"
+os.environ["CACHE_DIR"] = os.path.join(TMP, "cache")
+os.environ["UPLOAD_SWEEP_INTERVAL_SEC"] = "0"
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def wc():
+    import app as wc_app
+    from werkzeug.security import generate_password_hash
+
+    wc_app.app.config.update(TESTING=True)
+    with wc_app.app.app_context():
+        db, User = wc_app.db, wc_app.User
+        if not User.query.filter_by(username="admin-test").first():
+            db.session.add(User(username="admin-test", password=generate_password_hash("pw"), role="admin"))
+            db.session.add(User(username="user-test", password=generate_password_hash("pw"), role="user"))
+            db.session.commit()
+    return wc_app
+
+
+def login(client, username):
+    client.post("/login", data={"username": username, "password": "pw"})
+    return client
+
+
+@pytest.fixture
+def admin_client(wc):
+    return login(wc.app.test_client(), "admin-test")
+
+
+@pytest.fixture
+def user_client(wc):
+    return login(wc.app.test_client(), "user-test")
@@ -0,0 +1,16 @@
+def test_breadcrumbs_follow_script_name(wc):
+    client = wc.app.test_client()
+
+    prefixed = client.get("/cart", base_url="http://localhost/shop/")  # SCRIPT_NAME=/shop
+    plain = client.get("/cart")
+
+    assert prefixed.status_code == plain.status_code == 200
+    assert b'class="bc-link" href="/shop/?lang=ru"' in prefixed.data
+    assert b'class="bc-link" href="/shop/catalog?lang=ru"' in prefixed.data
+    assert b'class="bc-link" href="/catalog?lang=ru"' in plain.data
+
+
+def test_breadcrumbs_skip_missing_endpoints(wc, monkeypatch):
+    monkeypatch.setitem(wc.BREADCRUMBS_MAP, "no_such_view", ({"ru": "Нет"}, "index"))
+    with wc.app.test_request_context("/"):
+        assert wc._breadcrumb_trail("no_such_view", "ru") == [("Главная", "index"), ("Нет", None)]
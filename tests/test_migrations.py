@@ -0,0 +1,110 @@
+"""Апгрейд БД со схемой до миграций (как у старых установок) до HEAD через `flask db-upgrade`."""
+import os
+import sqlite3
+import subprocess
+import sys
+
+from conftest import ROOT
+
+BASELINE_SCHEMA = """
+CREATE TABLE user (
+    id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE,
+    password VARCHAR(200) NOT NULL, role VARCHAR(20)
+);
+CREATE TABLE category (
+    id INTEGER PRIMARY KEY, slug VARCHAR(60) NOT NULL UNIQUE, title_ru VARCHAR(120) NOT NULL,
+    title_lv VARCHAR(120) NOT NULL, title_en VARCHAR(120) NOT NULL, sort INTEGER, is_active BOOLEAN
+);
+CREATE TABLE product (
+    id INTEGER PRIMARY KEY, name_ru VARCHAR(200) NOT NULL, name_lv VARCHAR(200) NOT NULL,
+    price FLOAT NOT NULL, image VARCHAR(200), category VARCHAR(50)
+);
+CREATE TABLE "order" (
+    id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, name VARCHAR(100) NOT NULL,
+    contact VARCHAR(100) NOT NULL, items TEXT NOT NULL, total FLOAT NOT NULL,
+    status VARCHAR(30), created_at DATETIME
+);
+CREATE TABLE order_status_history (
+    id INTEGER PRIMARY KEY, order_id INTEGER NOT NULL, old_status VARCHAR(30),
+    new_status VARCHAR(30), changed_by VARCHAR(80), created_at DATETIME
+);
+CREATE TABLE order_comment (
+    id INTEGER PRIMARY KEY, order_id INTEGER NOT NULL, author VARCHAR(80),
+    text TEXT NOT NULL, created_at DATETIME
+);
+INSERT INTO user (id, username, password, role) VALUES (1, 'old', 'x', 'user');
+INSERT INTO product (id, name_ru, name_lv, price, image, category)
+    VALUES (1, 'Дверь', 'Durvis', 100, 'uploads/missing.jpg', 'windows');
+INSERT INTO "order" (id, user_id, name, contact, items, total, status, created_at)
+    VALUES (1, 1, 'Anna', '+371 2000-0000', 'Дверь × 1', 100, 'new', '2024-01-01 10:00:00');
+INSERT INTO "order" (id, user_id, name, contact, items, total, status, created_at)
+    VALUES (2, 1, 'Undated', '1', 'Дверь × 1', 100, 'completed', NULL),
+           (3, 1, 'Undated, no history', '1', 'Дверь × 1', 100, 'new', NULL);
+INSERT INTO order_status_history (order_id, old_status, new_status, changed_by, created_at)
+    VALUES (2, 'new', 'completed', 'admin', '2023-05-06 07:08:09'),
+           (2, 'completed', 'new', 'admin', '2023-06-01 00:00:00');
+"""
+
+
+def test_upgrade_baseline_db_to_head(tmp_path):
+    db_path = tmp_path / "baseline.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.executescript(BASELINE_SCHEMA)
+
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{db_path}",
+        AUTO_MIGRATE="0",
+        CACHE_DIR=str(tmp_path / "cache"),
+    )
+    res = subprocess.run(
+        [sys.executable, "-m", "flask", "--app", "app", "db-upgrade"],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert res.returncode == 0, res.stderr
+
+    import app as wc_app
+
+    assert f"schema version: {wc_app.SCHEMA_VERSION}" in res.stdout
+
+    with sqlite3.connect(db_path) as conn:
+        product_cols = {row[1] for row in conn.execute("PRAGMA table_info(product)")}
+        assert {"legacy_category", "category_id", "image_variants", "image_lqip"} <= product_cols
+
+        category_id, = conn.execute("SELECT category_id FROM product WHERE id = 1").fetchone()
+        slug, = conn.execute("SELECT slug FROM category WHERE id = ?", (category_id,)).fetchone()
+        assert slug == "windows"
+
+        digits, = conn.execute('SELECT phone_digits FROM "order" WHERE id = 1').fetchone()
+        assert digits == "37120000000"
+
+        created = dict(conn.execute('SELECT id, created_at FROM "order" WHERE id IN (2, 3)'))
+        assert created[2].startswith("2023-05-06 07:08:09")
+        assert created[3].startswith("1970-01-01")
+
+        versions = [v for (v,) in conn.execute("SELECT version FROM schema_version ORDER BY version")]
+        assert versions == [num for num, _, _ in wc_app.MIGRATIONS]
+
+
+def test_worker_refuses_to_start_on_old_schema(tmp_path):
+    db_path = tmp_path / "baseline.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.executescript(BASELINE_SCHEMA)
+
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{db_path}",
+        AUTO_MIGRATE="0",
+        CACHE_DIR=str(tmp_path / "cache"),
+    )
+    env.pop("FLASK_RUN_FROM_CLI", None)
+    res = subprocess.run(
+        [sys.executable, "-c", "import app"],
+        cwd=ROOT, env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert res.returncode != 0
+    assert "RuntimeError: DB schema version 0 <" in res.stderr
+
+    with sqlite3.connect(db_path) as conn:
+        tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert "upload_blob" not in tables
@@ -0,0 +1,102 @@
+"""SQLite-индекс поиска заказов: фоновая сборка, инвалидация, предел размера, длинный IN."""
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+def add_order(wc, name, contact="+371 2000 0000"):
+    with wc.app.app_context():
+        user = wc.User.query.filter_by(username="user-test").one()
+        order = wc.Order(
+            user_id=user.id, name=name, contact=contact, phone_digits=wc.phone_digits(contact),
+            items="P × 1", total=1,
+        )
+        wc.db.session.add(order)
+        wc.db.session.commit()
+        return order.id
+
+
+@pytest.fixture
+def index(wc, monkeypatch):
+    idx = wc.OrderSearchIndex()
+    monkeypatch.setattr(wc, "order_search_index", idx)
+    return idx
+
+
+def test_first_search_builds_in_background(wc, index, monkeypatch):
+    submitted = []
+    monkeypatch.setattr(wc, "submit_background", lambda fn, *args: submitted.append((fn, args)))
+
+    assert index.search("zzyzx") is None
+    assert index.search("zzyzx") is None
+    assert [fn for fn, _ in submitted] == [index.build]
+
+    fn, args = submitted[0]
+    fn(*args)
+    with wc.app.app_context():
+        assert index.search("zzyzx") == []
+
+
+def test_rename_and_delete_invalidate_index(wc, index, admin_client):
+    order_id = add_order(wc, "Quixote Sancho")
+    index.build()
+    with wc.app.app_context():
+        assert index.search("quixote") == [order_id]
+
+        wc.db.session.get(wc.Order, order_id).name = "Dulcinea"
+        wc.db.session.commit()
+        # версия сменилась — устаревший индекс не используется
+        assert index.search("quixote") is None
+    index.build()
+    with wc.app.app_context():
+        assert index.search("quixote") == []
+        assert index.search("dulcinea") == [order_id]
+
+    client = admin_client
+    with client.session_transaction() as sess:
+        token = sess.setdefault("csrf_token", "t")
+    client.post(f"/admin/orders/hard_delete/{order_id}", data={"csrf_token": token})
+    with wc.app.app_context():
+        assert wc.db.session.get(wc.Order, order_id) is None
+        assert index.search("dulcinea") is None
+
+
+def test_index_gives_up_above_max_docs(wc, index):
+    for i in range(3):
+        add_order(wc, f"Capped {i}")
+    index.max_docs = 2
+    index.build()
+
+    assert index.too_big
+    with wc.app.app_context():
+        assert index.search("capped") is None
+        # LIKE всё равно находит
+        found = wc.Order.query.filter(wc.order_search_filter("Capped")).count()
+    assert found == 3
+
+
+def test_many_matches_do_not_become_sql_variables(wc, index):
+    with wc.app.app_context():
+        user = wc.User.query.filter_by(username="user-test").one()
+        wc.db.session.execute(wc.Order.__table__.insert(), [
+            dict(user_id=user.id, name=f"Bulkbuyer {i}", contact="1", items="P", total=1, status="new",
+                 is_deleted=False, created_at=wc.datetime.utcnow())
+            for i in range(1500)
+        ])
+        wc.db.session.commit()
+    index.build()
+
+    params = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        params.append(parameters)
+
+    event.listen(Engine, "before_cursor_execute", record)
+    try:
+        with wc.app.app_context():
+            found = wc.Order.query.filter(wc.order_search_filter("bulkbuyer")).count()
+    finally:
+        event.remove(Engine, "before_cursor_execute", record)
+
+    assert found == 1500
+    assert max(len(p) for p in params) < 999
@@ -0,0 +1,55 @@
+from datetime import datetime
+
+import pytest
+
+
+@pytest.fixture
+def tied_orders(wc):
+    # по три заказа на одну и ту же секунду — ключ (created_at, id) должен их различать
+    with wc.app.app_context():
+        user = wc.User.query.filter_by(username="user-test").one()
+        for i in range(25):
+            wc.db.session.add(wc.Order(
+                user_id=user.id, name=f"KS{i}", contact="1", items="P × 1", total=1,
+                created_at=datetime(2022, 3, 1, 12, 0, i // 3),
+            ))
+        wc.db.session.commit()
+        ids = [o.id for o in wc.Order.query.filter(wc.Order.name.like("KS%"))]
+    return ids
+
+
+def test_keyset_pages_cover_every_order_once(wc, tied_orders):
+    with wc.app.app_context():
+        query = wc.Order.query.filter(wc.Order.name.like("KS%"))
+        pages, after = [], None
+        while True:
+            rows, next_cursor, _ = wc.keyset_orders_page(query, after=wc.decode_order_cursor(after), limit=4)
+            pages.append([o.id for o in rows])
+            if not next_cursor:
+                break
+            after = next_cursor
+
+        forward = [order_id for page in pages for order_id in page]
+        assert sorted(forward) == sorted(tied_orders)
+        assert len(forward) == len(set(forward))
+
+        # назад от последней страницы — те же страницы в обратном порядке
+        back, before = [], wc.encode_order_cursor(wc.db.session.get(wc.Order, pages[-1][0]))
+        while before:
+            rows, _, prev_cursor = wc.keyset_orders_page(query, before=wc.decode_order_cursor(before), limit=4)
+            back.insert(0, [o.id for o in rows])
+            before = prev_cursor
+        assert back == pages[:-1]
+
+
+def test_orders_count_cache_is_bounded_lru(wc, monkeypatch):
+    monkeypatch.setattr(wc, "ORDERS_COUNT_CACHE_SIZE", 3)
+    wc._orders_count_cache.clear()
+    with wc.app.app_context():
+        query = wc.Order.query
+        for q in ("a", "b", "c"):
+            wc.cached_orders_count(query, "active", q)
+        wc.cached_orders_count(query, "active", "a")  # свежий хит — "a" не вытесняется
+        wc.cached_orders_count(query, "active", "d")
+
+    assert list(wc._orders_count_cache) == [("active", "c"), ("active", "a"), ("active", "d")]
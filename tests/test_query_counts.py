@@ -0,0 +1,79 @@
+"""Число SQL-запросов на страницах списков не должно зависеть от числа строк (нет N+1)."""
+import pytest
+
+ORDERS_PAGE_MAX_QUERIES = 4
+CATALOG_MAX_QUERIES = 3
+
+
+def add_orders(wc, n, archived=False):
+    with wc.app.app_context():
+        db = wc.db
+        user = wc.User.query.filter_by(username="user-test").one()
+        for i in range(n):
+            order = wc.Order(
+                user_id=user.id, name=f"Q{i}", contact="+371 2000 0000", items="P × 1", total=10,
+                status="completed" if archived else "new", is_deleted=archived,
+            )
+            db.session.add(order)
+            db.session.flush()
+            for old, new in (("new", "confirmed"), ("confirmed", "new")):
+                db.session.add(wc.OrderStatusHistory(order_id=order.id, old_status=old, new_status=new))
+        db.session.commit()
+
+
+def add_products(wc, n):
+    with wc.app.app_context():
+        category = wc.Category.query.filter_by(slug="doors").one()
+        for i in range(n):
+            wc.db.session.add(wc.Product(
+                name_ru=f"QP{i}", name_lv=f"QP{i}", price=5, image="images/no-image.png", category_id=category.id,
+            ))
+        wc.db.session.commit()
+    wc.catalog_changed()
+
+
+def queries_for(wc, client, path):
+    client.get(path)  # прогрев кэшей процесса (меню категорий и т.п.)
+    with wc.count_queries() as q:
+        resp = client.get(path)
+    assert resp.status_code == 200
+    return q.count
+
+
+@pytest.mark.parametrize("path, archived", [("/admin/orders", False), ("/admin/orders?show=archive", True)])
+def test_admin_orders_query_count_is_constant(wc, admin_client, path, archived):
+    add_orders(wc, 3, archived)
+    small = queries_for(wc, admin_client, path)
+    add_orders(wc, 25, archived)
+    large = queries_for(wc, admin_client, path)
+
+    assert large == small
+    assert large <= ORDERS_PAGE_MAX_QUERIES
+
+
+def test_catalog_query_count_is_constant(wc, user_client):
+    add_products(wc, 2)
+    small = queries_for(wc, user_client, "/catalog")
+    add_products(wc, 30)
+    large = queries_for(wc, user_client, "/catalog")
+
+    assert large == small
+    assert large <= CATALOG_MAX_QUERIES
+
+
+def test_failed_queries_leave_no_timers_on_connection(wc):
+    from sqlalchemy.exc import OperationalError
+
+    with wc.app.app_context():
+        conn = wc.db.session.connection()
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.exec_driver_sql("SELECT * FROM no_such_table")
+        with wc.count_queries() as q:
+            conn.exec_driver_sql("SELECT 1")
+        leftover = conn.info.get("query_started")
+        wc.db.session.rollback()
+
+    assert q.count == 1
+    assert 0 <= q.time_ms < 1000
+    assert not leftover
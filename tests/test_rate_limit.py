@@ -0,0 +1,99 @@
+"""Общий лимит запросов: ровно limit на окно для всех воркеров, ограниченная память, короткий таймаут."""
+import multiprocessing
+import sqlite3
+import time
+
+import pytest
+
+# окно длиннее теста: граница окна не попадёт посередине проверки
+WINDOW = 10 ** 6
+
+
+def rows(path):
+    with sqlite3.connect(path) as conn:
+        return [k for (k,) in conn.execute("SELECT k FROM rl ORDER BY k")]
+
+
+def test_two_sqlite_instances_share_exact_limit(wc, tmp_path):
+    path = str(tmp_path / "rl.db")
+    worker_a, worker_b = wc.SQLiteRateLimitStore(path), wc.SQLiteRateLimitStore(path)
+
+    allowed = [w.take("login:1.2.3.4", 7, WINDOW) for _ in range(10) for w in (worker_a, worker_b)]
+
+    assert allowed.count(True) == 7
+    assert allowed[:7] == [True] * 7
+
+
+def _take_many(path, n, queue):
+    import app as wc_app
+
+    store = wc_app.SQLiteRateLimitStore(path, timeout=5)
+    queue.put(sum(store.take("checkout:9.9.9.9", 12, WINDOW) for _ in range(n)))
+
+
+def test_limit_holds_across_processes(wc, tmp_path):
+    path = str(tmp_path / "rl.db")
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    procs = [ctx.Process(target=_take_many, args=(path, 10, queue)) for _ in range(3)]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join(30)
+
+    assert sum(queue.get(timeout=5) for _ in procs) == 12
+
+
+def test_memory_store_window_resets_and_is_exact(wc):
+    store = wc.MemoryRateLimitStore()
+    window = 0.3
+    time.sleep(window - time.time() % window + 0.01)  # начало окна
+
+    assert [store.take("k", 3, window) for _ in range(5)] == [True, True, True, False, False]
+    time.sleep(window / 3)
+    # то же окно: ничего не "подтекает" (token bucket тут уже отдал бы ещё один запрос)
+    assert store.take("k", 3, window) is False
+    time.sleep(window)
+    assert store.take("k", 3, window) is True
+
+
+def test_sqlite_store_evicts_expired_and_overflowing_keys(wc, tmp_path):
+    path = str(tmp_path / "rl.db")
+    store = wc.SQLiteRateLimitStore(path, max_keys=5)
+    store.CLEANUP_EVERY = 1
+
+    store.take("short", 1, 0.2)
+    time.sleep(0.25)
+    store.take("long:0", 1, WINDOW)
+    assert rows(path) == ["long:0"]
+
+    for i in range(1, 10):
+        store.take(f"long:{i}", 1, WINDOW)
+    assert len(rows(path)) <= 5
+
+
+def test_memory_store_is_bounded(wc):
+    store = wc.MemoryRateLimitStore(max_keys=100)
+    for i in range(1000):
+        store.take(f"login:10.0.{i // 256}.{i % 256}", 5, WINDOW)
+    assert len(store._items) == 100
+
+
+@pytest.mark.parametrize("fail_open", [True, False])
+def test_locked_store_fails_fast_and_explicitly(wc, tmp_path, monkeypatch, fail_open):
+    path = str(tmp_path / "rl.db")
+    store = wc.SQLiteRateLimitStore(path, timeout=0.1)
+    store.take("warmup", 1, WINDOW)
+    monkeypatch.setattr(wc, "rl_store", store)
+    monkeypatch.setattr(wc, "RATELIMIT_FAIL_OPEN", fail_open)
+
+    blocker = sqlite3.connect(path, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        with wc.app.test_request_context("/login"):
+            started = time.monotonic()
+            assert wc._rl_allow("login", 20, 60) is fail_open
+            assert time.monotonic() - started < 1
+    finally:
+        blocker.execute("ROLLBACK")
+        blocker.close()
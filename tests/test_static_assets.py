@@ -0,0 +1,90 @@
+import gzip
+import os
+
+import pytest
+from werkzeug.exceptions import NotFound
+
+
+@pytest.mark.parametrize("filename", [
+    "../app.0123456789.py",
+    "../../../../etc/hostname.0123456789",
+    "../../../../../dev/zero.0123456789",
+    "css/missing.0123456789.css",
+])
+def test_fingerprint_outside_static_is_404_and_not_cached(wc, filename):
+    before = dict(wc.static_manifest._items)
+    with wc.app.test_request_context(f"/static/{filename}"):
+        with pytest.raises(NotFound):
+            wc.static_asset(filename)
+    assert wc.static_manifest._items == before
+
+
+def test_fingerprinted_css_is_immutable_and_gzipped(wc):
+    client = wc.app.test_client()
+    with wc.app.test_request_context():
+        url = wc.url_for("static", filename="css/style.css")
+    assert url != "/static/css/style.css"
+
+    resp = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert "immutable" in resp.headers["Cache-Control"]
+
+
+@pytest.fixture
+def asset(wc):
+    name = f"test-asset-{os.getpid()}.css"
+    path = os.path.join(wc.app.static_folder, name)
+    with open(path, "w") as f:
+        f.write("body { color: red; }\n" * 50)
+    wc._precompress_tried.pop(path, None)
+    yield name, path
+    for p in (path, path + ".gz", path + ".br"):
+        if os.path.exists(p):
+            os.remove(p)
+
+
+def _asset_url(wc, name):
+    with wc.app.test_request_context():
+        return wc.url_for("static", filename=name)
+
+
+def test_stale_sibling_is_not_served(wc, asset):
+    name, path = asset
+    with open(path + ".gz", "wb") as f:
+        f.write(gzip.compress(b"body { color: blue; }"))
+    old = os.stat(path).st_mtime_ns - 10**9
+    os.utime(path + ".gz", ns=(old, old))
+
+    resp = wc.app.test_client().get(_asset_url(wc, name), headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    assert resp.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(resp.data) == open(path, "rb").read()
+
+
+def test_failed_precompress_is_tried_once_per_process(wc, asset, monkeypatch):
+    name, path = asset
+    calls = []
+
+    def read_only(p):
+        calls.append(p)
+        return False
+
+    monkeypatch.setattr(wc, "precompress_file", read_only)
+    client = wc.app.test_client()
+    url = _asset_url(wc, name)
+    for _ in range(3):
+        resp = client.get(url, headers={"Accept-Encoding": "gzip, br"})
+        assert resp.status_code == 200
+        assert "Content-Encoding" not in resp.headers
+        assert resp.data == open(path, "rb").read()
+    assert calls == [path]
+
+
+def test_fresh_sibling_is_served_without_writing(wc, asset, monkeypatch):
+    name, path = asset
+    assert wc.precompress_file(path)
+    monkeypatch.setattr(wc, "precompress_file", lambda p: pytest.fail("precompress on request"))
+
+    resp = wc.app.test_client().get(_asset_url(wc, name), headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["Content-Encoding"] == "gzip"
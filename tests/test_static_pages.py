@@ -0,0 +1,53 @@
+def test_cached_page_og_url_has_no_query_string(wc):
+    wc.static_page_cache._items.clear()
+    client = wc.app.test_client()
+
+    first = client.get("/faq?utm_source=spam&x=<b>", headers={"Accept-Encoding": "identity"})
+    second = client.get("/faq", headers={"Accept-Encoding": "identity"})
+
+    assert first.status_code == second.status_code == 200
+    assert first.data == second.data
+    assert b'<meta property="og:url" content="http://localhost/faq">' in second.data
+
+
+def test_not_found_page_renders_og_url(wc):
+    resp = wc.app.test_client().get("/no-such-page?a=1")
+    assert resp.status_code == 404
+    assert b'content="http://localhost/no-such-page"' in resp.data
+
+
+def test_header_variant_comes_from_current_user_not_session(wc, admin_client, user_client):
+    wc.static_page_cache._items.clear()
+    assert b"/admin/products" in admin_client.get("/faq", headers={"Accept-Encoding": "identity"}).data
+
+    # устаревшая/подделанная роль в сессии не должна открывать админскую шапку
+    with user_client.session_transaction() as sess:
+        sess["user_role"] = "admin"
+    resp = user_client.get("/faq", headers={"Accept-Encoding": "identity"})
+    assert resp.status_code == 200
+    assert b"/admin/products" not in resp.data
+
+
+def test_foreign_host_is_rendered_without_caching(wc):
+    wc.static_page_cache._items.clear()
+    client = wc.app.test_client()
+
+    for i in range(5):
+        resp = client.get("/faq", headers={"Host": f"evil{i}.example", "Accept-Encoding": "identity"})
+        assert resp.status_code == 200
+        assert f'content="http://evil{i}.example/faq"'.encode() in resp.data
+    assert wc.static_page_cache.stats()["entries"] == 0
+
+    client.get("/faq", headers={"Accept-Encoding": "identity"})
+    assert wc.static_page_cache.stats()["entries"] == 1
+
+
+def test_static_page_cache_evicts_least_recently_used(wc):
+    cache = wc.StaticPageCache(max_entries=2)
+    cache.get_or_render("a", lambda: "A")
+    cache.get_or_render("b", lambda: "B")
+    cache.get_or_render("a", lambda: "A")   # a — свежая, вытеснится b
+    cache.get_or_render("c", lambda: "C")
+
+    assert list(cache._items) == ["a", "c"]
+    assert cache.get_or_render("a", lambda: "changed")["identity"][0] == b"A"
@@ -0,0 +1,183 @@
+"""Диспетчер telegram_outbox против локального фейкового Bot API (http.server)."""
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class FakeBotAPI(BaseHTTPRequestHandler):
+    """Ответ выбирается по тексту сообщения: "429", "400", "500" — ошибки, остальное — ok."""
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        text = payload.get("text", "")
+        with self.server.lock:
+            self.server.received.append(text)
+
+        if text == "429":
+            status, body = 429, {"ok": False, "error_code": 429, "parameters": {"retry_after": 30}}
+        elif text == "400":
+            status, body = 400, {"ok": False, "error_code": 400, "description": "Bad Request: chat not found"}
+        elif text == "500":
+            status, body = 500, {"ok": False, "error_code": 500}
+        else:
+            status, body = 200, {"ok": True, "result": {"message_id": 1}}
+
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_api(monkeypatch):
+    monkeypatch.setenv("TG_BOT_TOKEN", "123:test")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeBotAPI)
+    server.received = []
+    server.lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def outbox(wc):
+    def add(*texts, **fields):
+        with wc.app.app_context():
+            rows = [
+                wc.TelegramOutbox(payload=json.dumps({"chat_id": "1", "text": text}), **fields) for text in texts
+            ]
+            wc.db.session.add_all(rows)
+            wc.db.session.commit()
+            return [row.id for row in rows]
+
+    with wc.app.app_context():
+        wc.TelegramOutbox.query.delete()
+        wc.db.session.commit()
+    return add
+
+
+def dispatcher(wc, server, rate_per_sec=1000, store=None):
+    client = wc.TelegramClient(api_base=f"http://127.0.0.1:{server.server_port}")
+    return wc.TelegramOutboxDispatcher(
+        wc.app, client=client, rate_per_sec=rate_per_sec, store=store or wc.MemoryRateLimitStore()
+    )
+
+
+def row(wc, row_id):
+    with wc.app.app_context():
+        obj = wc.db.session.get(wc.TelegramOutbox, row_id)
+        wc.db.session.expunge(obj)
+        return obj
+
+
+def test_success_marks_row_sent(wc, fake_api, outbox):
+    row_id, = outbox("hello")
+
+    assert dispatcher(wc, fake_api).run_once() == 1
+
+    sent = row(wc, row_id)
+    assert sent.status == "sent" and sent.sent_at is not None and sent.last_error is None
+    assert fake_api.received == ["hello"]
+
+
+def test_429_honours_retry_after(wc, fake_api, outbox):
+    row_id, = outbox("429")
+
+    dispatcher(wc, fake_api).run_once()
+
+    retry = row(wc, row_id)
+    assert retry.status == "pending" and retry.attempts == 1
+    assert retry.last_error.startswith("429")
+    wait = (retry.next_attempt_at - datetime.utcnow()).total_seconds()
+    assert 25 < wait <= 30
+
+
+def test_4xx_marks_row_failed(wc, fake_api, outbox):
+    row_id, = outbox("400")
+
+    dispatcher(wc, fake_api).run_once()
+
+    failed = row(wc, row_id)
+    assert failed.status == "failed" and "chat not found" in failed.last_error
+
+
+def test_max_attempts_marks_row_failed(wc, fake_api, outbox):
+    last_try, = outbox("500", attempts=wc.TG_OUTBOX_MAX_ATTEMPTS - 1)
+    # строка, на которой процесс падал после захвата: attempts уже исчерпан — не отправляем
+    exhausted, = outbox("never", attempts=wc.TG_OUTBOX_MAX_ATTEMPTS, last_error="worker killed")
+
+    dispatcher(wc, fake_api).run_once()
+
+    assert row(wc, last_try).status == "failed"
+    dead = row(wc, exhausted)
+    assert dead.status == "failed" and dead.last_error == "worker killed"
+    assert fake_api.received == ["500"]
+
+
+def test_bad_payload_is_retried_with_error_then_failed(wc, fake_api, outbox):
+    row_id, = outbox("x")
+    with wc.app.app_context():
+        wc.db.session.get(wc.TelegramOutbox, row_id).payload = "{not json"
+        wc.db.session.commit()
+
+    dispatcher(wc, fake_api).run_once()
+
+    broken = row(wc, row_id)
+    assert broken.status == "pending" and broken.attempts == 1
+    assert "JSONDecodeError" in broken.last_error
+    assert broken.next_attempt_at > datetime.utcnow()
+
+    with wc.app.app_context():
+        obj = wc.db.session.get(wc.TelegramOutbox, row_id)
+        obj.attempts = wc.TG_OUTBOX_MAX_ATTEMPTS - 1
+        obj.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        wc.db.session.commit()
+    dispatcher(wc, fake_api).run_once()
+
+    assert row(wc, row_id).status == "failed"
+    assert fake_api.received == []
+
+
+def test_two_dispatchers_never_send_a_row_twice(wc, fake_api, outbox):
+    texts = [f"m{i}" for i in range(40)]
+    outbox(*texts)
+    store = wc.MemoryRateLimitStore()
+    workers = [dispatcher(wc, fake_api, store=store) for _ in range(2)]
+
+    threads = [threading.Thread(target=w.run_once) for w in workers for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for w in workers:
+        w.run_once()
+
+    assert sorted(fake_api.received) == sorted(texts)
+
+
+def test_send_rate_is_shared_between_dispatchers(wc, fake_api, outbox):
+    outbox(*[f"r{i}" for i in range(6)])
+    store = wc.MemoryRateLimitStore()
+    workers = [dispatcher(wc, fake_api, rate_per_sec=5, store=store) for _ in range(2)]
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=w.run_once) for w in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(fake_api.received) == 6
+    # 6 отправок по общему слоту 0.2 с — не быстрее 5 интервалов (по отдельности было бы ~0.4 с)
+    assert time.monotonic() - started >= 0.95
@@ -0,0 +1,23 @@
+def test_sqlite_store_add_is_shared_between_instances(wc, tmp_path):
+    # два экземпляра = два gunicorn-воркера с одним файлом
+    path = str(tmp_path / "rl.db")
+    worker_a = wc.SQLiteRateLimitStore(path)
+    worker_b = wc.SQLiteRateLimitStore(path)
+
+    assert worker_a.add("tg:u:1", 60) is True
+    assert worker_b.add("tg:u:1", 60) is False
+    assert worker_b.add("tg:u:2", 60) is True
+
+
+def test_webhook_retry_is_processed_once(wc, monkeypatch):
+    monkeypatch.setenv("TG_WEBHOOK_SECRET", "s3cret")
+    submitted = []
+    monkeypatch.setattr(wc.tg_pool, "submit", lambda fn, *args: submitted.append((fn, args)))
+
+    client = wc.app.test_client()
+    update = {"update_id": 987654, "callback_query": {"id": "cb-987654", "data": "order:1:status:confirmed"}}
+    headers = {"X-Telegram-Bot-Api-Secret-Token": "s3cret"}
+    for _ in range(3):
+        assert client.post("/tg/webhook", json=update, headers=headers).status_code == 200
+
+    assert [fn for fn, _ in submitted] == [wc._tg_process_callback]
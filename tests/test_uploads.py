@@ -0,0 +1,243 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+
+@pytest.fixture
+def static_dir(wc, tmp_path, monkeypatch):
+    os.makedirs(tmp_path / "uploads")
+    monkeypatch.setattr(wc.app, "static_folder", str(tmp_path))
+    return tmp_path
+
+
+def jpeg_bytes(size=(900, 600), color=(120, 80, 40)):
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+
+def upload(wc, client, name, data, filename="photo.jpg"):
+    client.get("/admin/products")
+    with client.session_transaction() as sess:
+        token = sess["csrf_token"]
+    return client.post(
+        "/admin/products",
+        data={
+            "csrf_token": token, "name_ru": name, "name_lv": name, "price": "10", "category": "doors",
+            "image": (io.BytesIO(data), filename, "image/jpeg"),
+        },
+        content_type="multipart/form-data",
+    )
+
+
+def wait_background(wc):
+    wc.bg_pool.shutdown(wait=True)
+
+
+def test_same_image_twice_shares_blob_and_variants(wc, admin_client, static_dir):
+    data = jpeg_bytes()
+    upload(wc, admin_client, "dup-1", data)
+    upload(wc, admin_client, "dup-2", data)
+    wait_background(wc)
+
+    with wc.app.app_context():
+        products = wc.Product.query.filter(wc.Product.name_ru.in_(["dup-1", "dup-2"])).all()
+        assert len(products) == 2
+        assert products[0].image == products[1].image
+        for p in products:
+            assert p.image_variants and p.image_lqip and p.image_width == 900
+            for _, rel in p.variants()["webp"]:
+                assert os.path.isfile(static_dir / rel)
+
+        blob = wc.UploadBlob.query.filter_by(path=products[0].image).one()
+        assert blob.refcount == 2
+
+    assert not [n for n in os.listdir(static_dir / "uploads") if n.endswith(".tmp")]
+
+
+def test_acquire_blob_insert_race_keeps_callers_pending_work(wc, monkeypatch):
+    import sqlalchemy as sa
+
+    real_update = wc.update
+    calls = []
+
+    def update_missing_first_time(model):
+        # первый UPDATE «не видит» строку — как будто её вставил параллельный запрос
+        calls.append(model)
+        stmt = real_update(model)
+        return stmt.where(sa.false()) if len(calls) == 1 else stmt
+
+    with wc.app.app_context():
+        db = wc.db
+        db.session.add(wc.UploadBlob(sha256="a" * 64, path="uploads/race.jpg", size=1, refcount=1))
+        db.session.commit()
+
+        db.session.add(wc.Category(slug="race-pending", title_ru="r", title_lv="r", title_en="r"))
+        monkeypatch.setattr(wc, "update", update_missing_first_time)
+        path = wc._acquire_blob("a" * 64, "uploads/other.jpg", 1)
+        db.session.commit()
+
+        assert path == "uploads/race.jpg"
+        assert wc.Category.query.filter_by(slug="race-pending").count() == 1
+        assert db.session.get(wc.UploadBlob, "a" * 64).refcount == 2
+
+
+def test_sweep_removes_only_expired_orphans(wc, static_dir):
+    from datetime import datetime, timedelta
+
+    old = datetime.utcnow() - timedelta(hours=1)
+    rows = {
+        "b" * 64: (0, old),                 # сирота дольше grace — удаляется
+        "c" * 64: (0, datetime.utcnow()),   # только что освобождён — ждёт
+        "d" * 64: (1, None),                # используется
+    }
+    with wc.app.app_context():
+        for digest, (refcount, orphaned_at) in rows.items():
+            rel = f"uploads/{digest}.jpg"
+            (static_dir / rel).write_bytes(b"x")
+            (static_dir / f"uploads/{digest}.w320.webp").write_bytes(b"x")
+            wc.db.session.add(wc.UploadBlob(
+                sha256=digest, path=rel, size=1, refcount=refcount, orphaned_at=orphaned_at
+            ))
+        wc.db.session.commit()
+
+        assert wc.sweep_upload_blobs(grace_sec=600) == 1
+        assert wc.db.session.get(wc.UploadBlob, "b" * 64) is None
+        assert not (static_dir / f"uploads/{'b' * 64}.jpg").exists()
+        assert not (static_dir / f"uploads/{'b' * 64}.w320.webp").exists()
+        for digest in ("c" * 64, "d" * 64):
+            assert wc.db.session.get(wc.UploadBlob, digest) is not None
+            assert (static_dir / f"uploads/{digest}.jpg").exists()
+
+
+def test_sweep_does_not_unlink_blob_reuploaded_concurrently(wc, static_dir, monkeypatch):
+    import threading
+    from datetime import datetime, timedelta
+
+    digest = "e" * 64
+    rel = f"uploads/{digest}.jpg"
+    (static_dir / rel).write_bytes(b"x")
+    with wc.app.app_context():
+        wc.db.session.add(wc.UploadBlob(
+            sha256=digest, path=rel, size=1, refcount=0, orphaned_at=datetime.utcnow() - timedelta(hours=1)
+        ))
+        wc.db.session.commit()
+
+    def reupload():
+        # store_upload того же файла: refcount/строка, файл на место, commit вместе с товаром
+        with wc.app.app_context():
+            wc._acquire_blob(digest, rel, 1)
+            (static_dir / rel).write_bytes(b"x")
+            wc.db.session.commit()
+
+    uploader = threading.Thread(target=reupload)
+    real_remove = os.remove
+
+    def remove(path):
+        # загрузка вклинивается между DELETE строки и unlink файла
+        if path.endswith(f"{digest}.jpg") and not uploader.is_alive() and uploader.ident is None:
+            uploader.start()
+            uploader.join(0.5)
+        real_remove(path)
+
+    monkeypatch.setattr(wc.os, "remove", remove)
+    with wc.app.app_context():
+        wc.sweep_upload_blobs(grace_sec=600)
+    uploader.join(10)
+    monkeypatch.setattr(wc.os, "remove", real_remove)
+
+    assert uploader.ident is not None and not uploader.is_alive()
+    with wc.app.app_context():
+        assert wc.db.session.get(wc.UploadBlob, digest).refcount == 1
+    assert (static_dir / rel).exists()
+
+
+def test_sweep_removes_old_untracked_upload_files(wc, static_dir):
+    import time
+
+    old = time.time() - 3600
+    files = {
+        "f" * 64 + ".jpg": old,          # строки нет, старый — удаляется
+        "f" * 64 + ".w320.webp": old,    # его вариант — тоже
+        "1" * 64 + ".jpg": time.time(),  # строки нет, но свежий (загрузка ещё не закоммичена)
+        "2" * 64 + ".jpg": old,          # есть строка blob'а
+        "legacy-photo.jpg": old,         # не наш формат имени — не трогаем
+    }
+    for name, mtime in files.items():
+        path = static_dir / "uploads" / name
+        path.write_bytes(b"x")
+        os.utime(path, (mtime, mtime))
+    with wc.app.app_context():
+        wc.db.session.add(wc.UploadBlob(sha256="2" * 64, path=f"uploads/{'2' * 64}.jpg", size=1, refcount=1))
+        wc.db.session.commit()
+        wc.sweep_upload_blobs(grace_sec=600)
+
+    left = set(os.listdir(static_dir / "uploads"))
+    assert left == {"1" * 64 + ".jpg", "2" * 64 + ".jpg", "legacy-photo.jpg"}
+
+
+def test_same_image_with_missing_variant_files_is_regenerated(wc, admin_client, static_dir):
+    data = jpeg_bytes(color=(10, 200, 30))
+    upload(wc, admin_client, "inc-1", data)
+    wait_background(wc)
+    with wc.app.app_context():
+        first = wc.Product.query.filter_by(name_ru="inc-1").one()
+        for _, rel in first.variants()["webp"]:
+            os.remove(static_dir / rel)
+
+    upload(wc, admin_client, "inc-2", data)
+    wait_background(wc)
+    with wc.app.app_context():
+        second = wc.Product.query.filter_by(name_ru="inc-2").one()
+        assert second.image == first.image and second.image_lqip and second.image_width == 900
+        for _, rel in second.variants()["webp"]:
+            assert os.path.isfile(static_dir / rel)
+
+
+def edit_image(client, product_id, image):
+    client.get(f"/admin/products/edit/{product_id}")
+    with client.session_transaction() as sess:
+        token = sess["csrf_token"]
+    return client.post(
+        f"/admin/products/edit/{product_id}",
+        data={"csrf_token": token, "name_ru": "edit", "name_lv": "edit", "price": "10", "image": image},
+    )
+
+
+@pytest.mark.parametrize("image", [
+    "../app.py",
+    "/etc/passwd",
+    "uploads/../../app.py",
+    "css/style.css",
+    "uploads/missing.jpg",
+    "",
+])
+def test_edit_product_rejects_image_outside_images_and_uploads(wc, admin_client, static_dir, image):
+    upload(wc, admin_client, "edit-bad", jpeg_bytes())
+    (static_dir / "css").mkdir(exist_ok=True)
+    (static_dir / "css" / "style.css").write_text("body{}")
+    with wc.app.app_context():
+        product = wc.Product.query.filter_by(name_ru="edit-bad").order_by(wc.Product.id.desc()).first()
+        pid, before = product.id, product.image
+
+    resp = edit_image(admin_client, pid, image)
+    assert resp.status_code == 302
+    assert resp.headers["Location"].endswith(f"/admin/products/edit/{pid}")
+    with wc.app.app_context():
+        product = wc.db.session.get(wc.Product, pid)
+        assert (product.image, product.name_ru) == (before, "edit-bad")
+
+
+def test_edit_product_accepts_existing_image(wc, admin_client, static_dir):
+    upload(wc, admin_client, "edit-ok", jpeg_bytes())
+    (static_dir / "images").mkdir(exist_ok=True)
+    (static_dir / "images" / "door.jpg").write_bytes(jpeg_bytes(color=(1, 2, 3)))
+    with wc.app.app_context():
+        pid = wc.Product.query.filter_by(name_ru="edit-ok").order_by(wc.Product.id.desc()).first().id
+
+    edit_image(admin_client, pid, "images/door.jpg")
+    wait_background(wc)
+    with wc.app.app_context():
+        assert wc.db.session.get(wc.Product, pid).image == "images/door.jpg"